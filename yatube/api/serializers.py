@@ -0,0 +1,95 @@
+"""Сериализаторы строк ``values()``.
+
+Каждое поле ответа описано колонкой запроса и функцией
+преобразования. Запрашиваются только колонки выбранных через
+``?fields=`` полей, поэтому лишние JOIN и столбцы не читаются,
+а модели не создаются.
+"""
+from django.core.files.storage import default_storage
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def count(value):
+    return value or 0
+
+
+class Serializer:
+    fields = {}
+
+    def __init__(self, requested=None, prefix=''):
+        names = [
+            name.strip() for name in (requested or '').split(',')
+            if name.strip()
+        ] or list(self.fields)
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(
+                'Неизвестные поля: {}. Доступны: {}'.format(
+                    ', '.join(unknown), ', '.join(self.fields)
+                )
+            )
+        self.prefix = prefix
+        self.selected = [
+            (name, prefix + column, convert)
+            for name, (column, convert) in self.fields.items()
+            if name in names
+        ]
+
+    def columns(self):
+        return [column for _, column, _ in self.selected]
+
+    def __call__(self, row):
+        return {
+            name: convert(row[column]) if convert else row[column]
+            for name, column, convert in self.selected
+        }
+
+
+class PostSerializer(Serializer):
+    fields = {
+        'id': ('id', None),
+        'text': ('text', None),
+        'pub_date': ('pub_date', isoformat),
+        'author': ('author__username', None),
+        'group': ('group__slug', None),
+        'image': ('image', media_url),
+        'thumbnail': ('thumbnail', media_url),
+        'comments_count': ('comments_count', None),
+    }
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        'id': ('id', None),
+        'post': ('post_id', None),
+        'parent': ('parent_id', None),
+        'author': ('author__username', None),
+        'text': ('text', None),
+        'created': ('created', isoformat),
+    }
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        'slug': ('slug', None),
+        'title': ('title', None),
+        'description': ('description', None),
+    }
+
+
+class ProfileSerializer(Serializer):
+    fields = {
+        'username': ('username', None),
+        'first_name': ('first_name', None),
+        'last_name': ('last_name', None),
+        'posts_count': ('stats__posts_count', count),
+        'followers_count': ('stats__followers_count', count),
+        'following_count': ('stats__following_count', count),
+    }
@@ -0,0 +1,202 @@
+import gzip
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.cache import get_generations
+from posts import follows
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {index}', group=cls.group
+            )
+            for index in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'api:{name}', args=args), params)
+
+    @override_settings(LIMIT_POSTS=2)
+    def test_cursor_pagination(self):
+        """Список постов листается по курсору в обе стороны."""
+        first = self.get('post_list').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+
+        self.assertEqual(
+            [post['text'] for post in first['results']], ['Пост 4', 'Пост 3']
+        )
+        self.assertEqual(
+            [post['text'] for post in second['results']], ['Пост 2', 'Пост 1']
+        )
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(first['previous'])
+
+    def test_sparse_fields(self):
+        """``?fields=`` ограничивает поля ответа и колонки запроса."""
+        response = self.get('post_detail', self.posts[0].pk, fields='id,text')
+
+        self.assertEqual(
+            response.json(), {'id': self.posts[0].pk, 'text': 'Пост 0'}
+        )
+        response = self.get('post_list', fields='id,unknown')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('unknown', response.json()['detail'])
+
+    def test_resources(self):
+        """Группы, профили, комментарии и лента подписок."""
+        self.assertEqual(self.get('group_list').json()['results'], [{
+            'slug': 'group', 'title': 'Группа', 'description': 'Описание',
+        }])
+        self.assertEqual(
+            len(self.get('group_posts', 'group').json()['results']), 5
+        )
+        profile = self.get('profile_detail', 'author').json()
+        self.assertEqual(profile['first_name'], 'Лев')
+        self.assertEqual(profile['posts_count'], 5)
+        self.assertEqual(profile['followers_count'], 1)
+        comments = self.get('comment_list', self.posts[0].pk).json()
+        self.assertEqual(comments['results'][0]['author'], 'reader')
+        self.assertEqual(
+            self.get('profile_posts', 'nobody').status_code,
+            HTTPStatus.NOT_FOUND,
+        )
+        self.assertEqual(
+            self.get('follow_feed').status_code, HTTPStatus.UNAUTHORIZED
+        )
+        self.client.force_login(self.reader)
+        feed = self.get('follow_feed', fields='text').json()
+        self.assertEqual(feed['results'][0], {'text': 'Пост 4'})
+
+    def test_gzip_and_etag(self):
+        """Ответ сжимается, повторный запрос с ETag получает 304."""
+        response = self.client.get(
+            reverse('api:post_list'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'results', gzip.decompress(response.content))
+        cached = self.client.get(
+            reverse('api:post_list'), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Новый пост')
+        fresh = self.client.get(
+            reverse('api:post_list'), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(fresh.status_code, HTTPStatus.OK)
+
+    def test_follow_endpoints(self):
+        """Подписка и отписка через API возвращают новое состояние."""
+        url = reverse('api:profile_follow', args=('reader',))
+        self.assertEqual(
+            self.client.post(url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+        self.client.force_login(self.author)
+
+        self.assertEqual(self.client.post(url).json(), {
+            'username': 'reader', 'following': True, 'changed': True,
+        })
+        self.assertFalse(self.client.post(url).json()['changed'])
+        self.assertEqual(self.client.delete(url).json(), {
+            'username': 'reader', 'following': False, 'changed': True,
+        })
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+
+    def test_follow_many(self):
+        """Пакетная подписка пропускает уже существующие подписки."""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Пост другого')
+        self.client.force_login(self.reader)
+
+        response = self.client.post(
+            reverse('api:follow_many'),
+            {'authors': ['author', 'other', 'reader', 'nobody']},
+            content_type='application/json',
+        ).json()
+
+        self.assertCountEqual(response['results'], [
+            {'username': 'author', 'following': True, 'changed': False},
+            {'username': 'other', 'following': True, 'changed': True},
+        ])
+        self.assertEqual(response['missing'], ['nobody'])
+        self.assertEqual(other.stats.followers_count, 1)
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.reader.stats.following_count, 2)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post__author=other)
+        )
+        self.assertEqual(self.client.post(
+            reverse('api:follow_many'), 'authors',
+            content_type='application/json',
+        ).status_code, HTTPStatus.BAD_REQUEST)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_follow_many_backfills_prolific_authors(self):
+        """Пакетная подписка, как и одиночная, переносит в ленту
+        прошлые посты популярных авторов."""
+        prolific = User.objects.create_user(username='prolific')
+        Follow.objects.create(user=self.author, author=prolific)
+        old = Post.objects.create(author=prolific, text='Старый пост')
+        self.client.force_login(self.reader)
+
+        self.client.post(
+            reverse('api:follow_many'), {'authors': ['prolific']},
+            content_type='application/json',
+        )
+
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=old).exists()
+        )
+
+
+class FollowCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+
+    def generation(self):
+        return get_generations('author:author')[0]
+
+    def test_generation_bumped_after_commit(self):
+        """Поколения кеша меняются только после фиксации подписки."""
+        before = self.generation()
+        with transaction.atomic():
+            follows.follow_many(self.reader, [self.author])
+            self.assertEqual(self.generation(), before)
+            transaction.set_rollback(True)
+        self.assertEqual(self.generation(), before)
+
+        follows.follow_many(self.reader, [self.author])
+        self.assertGreater(self.generation(), before)
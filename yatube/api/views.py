@@ -0,0 +1,270 @@
+"""Read-only JSON API ``/api/v1/``.
+
+Списки отдаются страницами по курсору (``?cursor=``, ``?limit=``),
+поля выбираются через ``?fields=``. Ответы сжимаются gzip и снабжаются
+ETag: для публичных ресурсов он считается по поколениям областей кеша
+без выполнения запроса, для остальных — по содержимому ответа.
+
+Изменяют данные только подписки (``POST``/``DELETE``); эти запросы
+проходят проверку CSRF, как формы сайта.
+"""
+import json
+from functools import wraps
+
+from core.cache import generation_etag
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import (condition, conditional_page,
+                                          require_GET, require_http_methods)
+
+from posts import feed, follows
+from posts.models import Comment, FeedEntry, Group, Post
+from posts.utils import POST_ORDERING, CursorPaginator
+
+from .serializers import (CommentSerializer, GroupSerializer, PostSerializer,
+                          ProfileSerializer)
+
+User = get_user_model()
+
+COMMENT_ORDERING = ('created', 'pk')
+GROUP_ORDERING = ('slug',)
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def handle_errors(view_func):
+    """Превращает ``ApiError`` в JSON-ответ с её статусом."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except ApiError as error:
+            return json_response(
+                {'detail': error.detail}, status=error.status
+            )
+    return wrapper
+
+
+def api_view(scopes=None):
+    """GET-представление API: ответ сжимается и получает ETag."""
+    def decorator(view_func):
+        wrapper = handle_errors(view_func)
+        if scopes is not None:
+            wrapper = condition(etag_func=generation_etag(scopes))(wrapper)
+        return gzip_page(conditional_page(require_GET(wrapper)))
+    return decorator
+
+
+def api_action(methods):
+    """Изменяющее представление API: только для вошедших."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                raise ApiError(401, 'Требуется вход')
+            return view_func(request, *args, **kwargs)
+        return require_http_methods(methods)(handle_errors(wrapper))
+    return decorator
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def serializer(request, serializer_class, prefix=''):
+    try:
+        return serializer_class(request.GET.get('fields'), prefix)
+    except ValueError as error:
+        raise ApiError(400, str(error))
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def page_response(request, queryset, serialize, ordering=POST_ORDERING):
+    try:
+        limit = int(request.GET.get('limit', settings.LIMIT_POSTS))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом')
+    limit = min(max(limit, 1), settings.API_MAX_LIMIT)
+    columns = serialize.columns() + [name.lstrip('-') for name in ordering]
+    paginator = CursorPaginator(
+        queryset.values(*columns), limit, ordering=ordering
+    )
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    return json_response({
+        'results': [serialize(row) for row in page.object_list],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+def detail_response(queryset, serialize, message):
+    row = queryset.values(*serialize.columns()).first()
+    if row is None:
+        raise ApiError(404, message)
+    return json_response(serialize(row))
+
+
+def posts_scopes(request):
+    return ('posts',)
+
+
+def group_scopes(request, slug):
+    return (f'group:{slug}',)
+
+
+def profile_scopes(request, username):
+    return (f'author:{username}',)
+
+
+def post_scopes(request, post_id):
+    return (f'post:{post_id}',)
+
+
+@api_view(posts_scopes)
+def post_list(request):
+    return page_response(
+        request, Post.objects.all(), serializer(request, PostSerializer)
+    )
+
+
+@api_view(post_scopes)
+def post_detail(request, post_id):
+    return detail_response(
+        Post.objects.filter(pk=post_id),
+        serializer(request, PostSerializer),
+        'Пост не найден',
+    )
+
+
+@api_view(post_scopes)
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise ApiError(404, 'Пост не найден')
+    return page_response(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        serializer(request, CommentSerializer),
+        ordering=COMMENT_ORDERING,
+    )
+
+
+@api_view(posts_scopes)
+def group_list(request):
+    return page_response(
+        request,
+        Group.objects.all(),
+        serializer(request, GroupSerializer),
+        ordering=GROUP_ORDERING,
+    )
+
+
+@api_view(group_scopes)
+def group_detail(request, slug):
+    return detail_response(
+        Group.objects.filter(slug=slug),
+        serializer(request, GroupSerializer),
+        'Группа не найдена',
+    )
+
+
+@api_view(group_scopes)
+def group_posts(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        raise ApiError(404, 'Группа не найдена')
+    return page_response(
+        request,
+        Post.objects.filter(group__slug=slug),
+        serializer(request, PostSerializer),
+    )
+
+
+@api_view(profile_scopes)
+def profile_detail(request, username):
+    return detail_response(
+        User.objects.filter(username=username),
+        serializer(request, ProfileSerializer),
+        'Пользователь не найден',
+    )
+
+
+@api_view(profile_scopes)
+def profile_posts(request, username):
+    if not User.objects.filter(username=username).exists():
+        raise ApiError(404, 'Пользователь не найден')
+    return page_response(
+        request,
+        Post.objects.filter(author__username=username),
+        serializer(request, PostSerializer),
+    )
+
+
+def follow_state(username, state):
+    return {
+        'username': username,
+        'following': state.following,
+        'changed': state.changed,
+    }
+
+
+@api_action(['POST', 'DELETE'])
+def profile_follow(request, username):
+    author = User.objects.filter(username=username).only('username').first()
+    if author is None:
+        raise ApiError(404, 'Пользователь не найден')
+    if request.method == 'POST':
+        state = follows.follow(request.user, author)
+    else:
+        state = follows.unfollow(request.user, author)
+    return json_response(follow_state(username, state))
+
+
+@api_action(['POST'])
+def follow_many(request):
+    try:
+        usernames = json.loads(request.body)['authors']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError(400, 'Ожидается JSON вида {"authors": [...]}')
+    if not isinstance(usernames, list) or not all(
+        isinstance(name, str) for name in usernames
+    ):
+        raise ApiError(400, 'authors должен быть списком имён')
+    if len(usernames) > settings.API_MAX_LIMIT:
+        raise ApiError(
+            400, f'Не больше {settings.API_MAX_LIMIT} авторов за запрос'
+        )
+    authors = User.objects.filter(username__in=usernames).only('username')
+    states = follows.follow_many(request.user, authors)
+    return json_response({
+        'results': [
+            follow_state(name, state) for name, state in states.items()
+        ],
+        'missing': sorted(
+            set(usernames) - states.keys() - {request.user.username}
+        ),
+    })
+
+
+@api_view()
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Требуется вход')
+    serialize = serializer(request, PostSerializer, prefix='post__')
+    feed.pull_prolific(request.user.pk)
+    return page_response(
+        request, FeedEntry.objects.filter(user=request.user), serialize
+    )
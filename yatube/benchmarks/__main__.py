@@ -0,0 +1,289 @@
+"""Бенчмарки приложения posts.
+
+Запуск из каталога ``yatube``::
+
+    python -m benchmarks generate --scale 0.01
+    python -m benchmarks run --iterations 200
+    python -m benchmarks compare results/old.json results/new.json
+    python -m benchmarks concurrency --clients 200 --workers 8
+    python -m benchmarks render --iterations 100
+    python -m benchmarks writers --writers 8 --readers 8
+    python -m benchmarks threads --roots 20 --width 20
+
+По умолчанию используется отдельная база ``benchmarks/bench.sqlite3``
+(переменная окружения ``BENCHMARK_DB``) и настройки
+``benchmarks.settings``.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import django
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def generate(args):
+    from django.core.management import call_command
+
+    from .generate import FULL_VOLUMES, Generator, dataset_size
+
+    call_command('migrate', verbosity=0)
+    if dataset_size()['users']:
+        if not args.flush:
+            sys.exit('База уже содержит данные, используйте --flush')
+        call_command('flush', interactive=False, verbosity=0)
+    volumes = {
+        name: max(1, int(value * args.scale))
+        for name, value in FULL_VOLUMES.items()
+    }
+    Generator(seed=args.seed, exponent=args.exponent).run(
+        follows=args.follows, **volumes
+    )
+    print(json.dumps(dataset_size(), ensure_ascii=False))
+
+
+def run(args):
+    from .run import run, save
+    from .scenarios import SCENARIOS
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit('Неизвестные сценарии: ' + ', '.join(sorted(unknown)))
+    results = run(
+        args.scenarios or None,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        seed=args.seed,
+        cold=args.cold,
+    )
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S.json')
+    )
+    save(results, path)
+    for name, summary in results['scenarios'].items():
+        print(
+            f'{name:<14} {summary["throughput_rps"]:>8} rps  '
+            f'p50 {summary["latency_ms"]["p50"]:>8} ms  '
+            f'p99 {summary["latency_ms"]["p99"]:>8} ms  '
+            f'запросов {summary["queries"]["mean"]}'
+        )
+    print(f'Результаты: {path}')
+
+
+def concurrency(args):
+    from .concurrency import compare_servers
+    from .run import save
+
+    results = compare_servers(
+        clients=args.clients,
+        workers=args.workers,
+        delay=args.delay,
+        seed=args.seed,
+    )
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('concurrency-%Y%m%d-%H%M%S.json')
+    )
+    save(results, path)
+    for mode, summary in results['modes'].items():
+        print(
+            f'{mode:<5} {summary["throughput_rps"]:>8} rps  '
+            f'p50 {summary["latency_ms"]["p50"]:>8} ms  '
+            f'p99 {summary["latency_ms"]["p99"]:>8} ms  '
+            f'ошибок {summary["errors"]}'
+        )
+    print(f'Результаты: {path}')
+
+
+def render(args):
+    from .render import compare_rendering
+    from .run import save
+
+    results = compare_rendering(
+        iterations=args.iterations, warmup=args.warmup, seed=args.seed
+    )
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('render-%Y%m%d-%H%M%S.json')
+    )
+    save(results, path)
+    for mode, pages in results['modes'].items():
+        for name, summary in pages.items():
+            print(
+                f'{mode:<13} {name:<13} '
+                f'шаблоны p50 {summary["template_ms"]["p50"]:>7} ms  '
+                f'всего p50 {summary["total_ms"]["p50"]:>7} ms'
+            )
+    print(f'Результаты: {path}')
+
+
+def writers(args):
+    from .run import save
+    from .writers import compare_profiles
+
+    results = compare_profiles(
+        writers=args.writers,
+        readers=args.readers,
+        duration=args.duration,
+        seed=args.seed,
+    )
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('writers-%Y%m%d-%H%M%S.json')
+    )
+    save(results, path)
+    for profile, kinds in results['profiles'].items():
+        flush = kinds.pop('flush', None)
+        for kind, summary in kinds.items():
+            print(
+                f'{profile:<8} {kind:<6} {summary["throughput_rps"]:>8} rps  '
+                f'p50 {summary["latency_ms"]["p50"]:>8} ms  '
+                f'p99 {summary["latency_ms"]["p99"]:>8} ms  '
+                f'ошибок {summary["errors"]}'
+            )
+        if flush:
+            print(
+                f'{profile:<8} flush  вставлено {flush["flushed"]}  '
+                f'задержка ср. {flush["mean_lag_ms"]} ms  '
+                f'макс. {flush["max_lag_ms"]} ms'
+            )
+    print(f'Результаты: {path}')
+
+
+def threads(args):
+    from .run import save
+    from .threads import compare_threads
+
+    results = compare_threads(
+        roots=args.roots, width=args.width, iterations=args.iterations
+    )
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(
+        RESULTS_DIR, time.strftime('threads-%Y%m%d-%H%M%S.json')
+    )
+    save(results, path)
+    for shape, loaders in results['shapes'].items():
+        for name, summary in loaders.items():
+            if name == 'comments':
+                continue
+            print(
+                f'{shape:<5} {name:<11} запросов {summary["queries"]:>5}  '
+                f'p50 {summary["p50_ms"]:>8} ms  '
+                f'p90 {summary["p90_ms"]:>8} ms'
+            )
+    print(f'Результаты: {path}')
+
+
+def compare(args):
+    from .run import compare
+
+    with open(args.old, encoding='utf-8') as old, \
+            open(args.new, encoding='utf-8') as new:
+        lines, regressions = compare(
+            json.load(old), json.load(new), args.threshold
+        )
+    print('\n'.join(lines))
+    if regressions:
+        sys.exit('Замедлились: ' + ', '.join(regressions))
+
+
+def main():
+    from .scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_generate = commands.add_parser(
+        'generate', help='создать тестовые данные'
+    )
+    parser_generate.add_argument(
+        '--scale', type=float, default=1.0,
+        help='доля от полного объёма (1M постов, 100k пользователей)',
+    )
+    parser_generate.add_argument('--follows', type=float, default=20)
+    parser_generate.add_argument('--exponent', type=float, default=1.1)
+    parser_generate.add_argument('--seed', type=int, default=42)
+    parser_generate.add_argument('--flush', action='store_true')
+    parser_generate.set_defaults(handler=generate)
+
+    parser_run = commands.add_parser('run', help='прогнать сценарии')
+    parser_run.add_argument(
+        'scenarios', nargs='*', help=', '.join(SCENARIOS),
+    )
+    parser_run.add_argument('--iterations', type=int, default=200)
+    parser_run.add_argument('--warmup', type=int, default=20)
+    parser_run.add_argument('--seed', type=int, default=42)
+    parser_run.add_argument(
+        '--cold', action='store_true',
+        help='очищать кеш перед каждым запросом',
+    )
+    parser_run.add_argument('--output')
+    parser_run.set_defaults(handler=run)
+
+    parser_compare = commands.add_parser('compare', help='сравнить прогоны')
+    parser_compare.add_argument('old')
+    parser_compare.add_argument('new')
+    parser_compare.add_argument(
+        '--threshold', type=float, default=10,
+        help='допустимый рост медианы задержки, %%',
+    )
+    parser_compare.set_defaults(handler=compare)
+
+    parser_concurrency = commands.add_parser(
+        'concurrency', help='WSGI против ASGI с медленными клиентами',
+    )
+    parser_concurrency.add_argument('--clients', type=int, default=200)
+    parser_concurrency.add_argument('--workers', type=int, default=8)
+    parser_concurrency.add_argument(
+        '--delay', type=float, default=0.05,
+        help='секунд на отправку запроса и на чтение ответа',
+    )
+    parser_concurrency.add_argument('--seed', type=int, default=42)
+    parser_concurrency.add_argument('--output')
+    parser_concurrency.set_defaults(handler=concurrency)
+
+    parser_render = commands.add_parser(
+        'render', help='время рендеринга лент до и после кешей шаблонов',
+    )
+    parser_render.add_argument('--iterations', type=int, default=100)
+    parser_render.add_argument('--warmup', type=int, default=20)
+    parser_render.add_argument('--seed', type=int, default=42)
+    parser_render.add_argument('--output')
+    parser_render.set_defaults(handler=render)
+
+    parser_writers = commands.add_parser(
+        'writers', help='одновременные add_comment и чтение на SQLite',
+    )
+    parser_writers.add_argument('--writers', type=int, default=8)
+    parser_writers.add_argument('--readers', type=int, default=8)
+    parser_writers.add_argument(
+        '--duration', type=float, default=10, help='секунд на профиль',
+    )
+    parser_writers.add_argument('--seed', type=int, default=42)
+    parser_writers.add_argument('--output')
+    parser_writers.set_defaults(handler=writers)
+
+    parser_threads = commands.add_parser(
+        'threads', help='загрузка глубоких и широких веток комментариев',
+    )
+    parser_threads.add_argument('--roots', type=int, default=20)
+    parser_threads.add_argument(
+        '--width', type=int, default=20,
+        help='ответов первого уровня на корень в широких ветках',
+    )
+    parser_threads.add_argument('--iterations', type=int, default=20)
+    parser_threads.add_argument('--output')
+    parser_threads.set_defaults(handler=threads)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+    main()
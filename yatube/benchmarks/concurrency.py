@@ -0,0 +1,129 @@
+"""WSGI против ASGI при множестве медленных клиентов.
+
+Модель без сетевого сервера: в WSGI-сервере с пулом из ``workers``
+потоков поток занят всё время обслуживания соединения — пока клиент
+досылает запрос, пока работает Django и пока клиент читает ответ.
+ASGI-обёртка ``core.asgi`` держит клиентов в цикле событий и занимает
+поток только на время работы Django. Все клиенты приходят разом,
+каждому нужно ``delay`` секунд на отправку запроса и на чтение ответа.
+"""
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WsgiToAsgi, build_environ, run_wsgi
+
+from .run import percentile
+from .scenarios import Sample, group_posts, index, post_detail, profile
+
+READ_SCENARIOS = (index, group_posts, profile, post_detail)
+
+
+def make_scope(path):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'host', b'testserver')],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+        'http_version': '1.1',
+        'scheme': 'http',
+    }
+
+
+def summarize(latencies, statuses, wall):
+    return {
+        'requests': len(latencies),
+        'errors': sum(status >= 400 for status in statuses),
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.5) * 1000, 1),
+            'p90': round(percentile(latencies, 0.9) * 1000, 1),
+            'p99': round(percentile(latencies, 0.99) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1),
+        },
+    }
+
+
+def run_wsgi_model(application, paths, workers, delay):
+    start = time.perf_counter()
+
+    def handle(path):
+        time.sleep(delay)
+        status, _, _ = run_wsgi(
+            application, build_environ(make_scope(path), BytesIO())
+        )
+        time.sleep(delay)
+        return time.perf_counter() - start, status
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(handle, paths))
+    wall = time.perf_counter() - start
+    return summarize(*zip(*results), wall)
+
+
+async def asgi_client(application, path, delay, start):
+    received = False
+    statuses = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()
+        await asyncio.sleep(delay)
+        received = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+        elif not message.get('more_body'):
+            await asyncio.sleep(delay)
+
+    await application(make_scope(path), receive, send)
+    return time.perf_counter() - start, statuses[0]
+
+
+def run_asgi_model(application, paths, workers, delay):
+    asgi = WsgiToAsgi(application, max_workers=workers)
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            asgi_client(asgi, path, delay, start) for path in paths
+        ))
+        return results, time.perf_counter() - start
+
+    results, wall = asyncio.run(main())
+    asgi.executor.shutdown()
+    return summarize(*zip(*results), wall)
+
+
+def compare_servers(clients=200, workers=8, delay=0.05, seed=42):
+    rng = random.Random(seed)
+    sample = Sample()
+    paths = [
+        rng.choice(READ_SCENARIOS)(rng, sample)[2] for _ in range(clients)
+    ]
+    application = get_wsgi_application()
+    # Прогрев: страницы и поколения кеша одинаковы для обоих режимов.
+    run_wsgi_model(application, sorted(set(paths)), workers, 0)
+    return {
+        'meta': {
+            'clients': clients,
+            'workers': workers,
+            'delay_s': delay,
+            'seed': seed,
+        },
+        'modes': {
+            'wsgi': run_wsgi_model(application, paths, workers, delay),
+            'asgi': run_asgi_model(application, paths, workers, delay),
+        },
+    }
@@ -0,0 +1,179 @@
+"""Генератор данных для бенчмарков.
+
+Пользователи, посты, комментарии и подписки вставляются пачками через
+``bulk_create`` — сигналы при этом не срабатывают, поэтому счётчики,
+ленты подписок и поисковый индекс потом строятся целиком. Популярность
+авторов распределена по закону Ципфа: немногие пишут много и собирают
+большую часть подписчиков. Один и тот же ``seed`` даёт те же данные.
+"""
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+
+from posts import counters, feed, search, threads
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.transfer import manual_dates
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+PERIOD = timedelta(days=365)
+
+FULL_VOLUMES = {
+    'users': 100_000,
+    'posts': 1_000_000,
+    'groups': 200,
+    'comments': 2_000_000,
+}
+
+
+class Generator:
+    def __init__(self, seed=42, exponent=1.1, log=print):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.mixer = Mixer(locale='ru_RU')
+        self.mixer.faker.seed_instance(seed)
+        self.exponent = exponent
+        self.log = log
+        self.now = timezone.now()
+
+    def zipf(self, count):
+        """Накопленные веса рангов 1..count по закону Ципфа."""
+        return list(accumulate(
+            1 / rank ** self.exponent for rank in range(1, count + 1)
+        ))
+
+    def dates(self, count):
+        """Возрастающие даты за последний год."""
+        step = PERIOD / max(count, 1)
+        start = self.now - PERIOD
+        for index in range(count):
+            yield start + step * index + step * self.rng.random()
+
+    def insert(self, model, objects, **kwargs):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_create(batch, **kwargs)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch, **kwargs)
+
+    def users(self, count):
+        password = make_password(None)
+        self.insert(User, (
+            User(
+                username=f'user{index}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password,
+            )
+            for index in range(count)
+        ))
+        self.user_ids = list(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        # Ранг автора по популярности — его место в случайной перестановке.
+        self.authors = self.user_ids[:]
+        self.rng.shuffle(self.authors)
+        self.author_weights = self.zipf(len(self.authors))
+
+    def groups(self, count):
+        self.mixer.cycle(count).blend(
+            Group, slug=self.mixer.sequence('group-{0}')
+        )
+        self.group_ids = list(Group.objects.values_list('pk', flat=True))
+
+    def pick_author(self):
+        return self.rng.choices(
+            self.authors, cum_weights=self.author_weights
+        )[0]
+
+    def posts(self, count):
+        self.insert(Post, (
+            Post(
+                text=self.fake.text(max_nb_chars=self.rng.choice(
+                    (100, 300, 1000)
+                )),
+                pub_date=pub_date,
+                author_id=self.pick_author(),
+                group_id=(
+                    self.rng.choice(self.group_ids)
+                    if self.group_ids and self.rng.random() < 0.7 else None
+                ),
+            )
+            for pub_date in self.dates(count)
+        ))
+
+    def comments(self, count):
+        posts = Post.objects.order_by('pk').values_list('pk', flat=True)
+        first, last = posts.first(), posts.last()
+        if first is None:
+            return
+        self.insert(Comment, (
+            Comment(
+                post_id=self.rng.randint(first, last),
+                author_id=self.rng.choice(self.user_ids),
+                text=self.fake.sentence(),
+                created=created,
+            )
+            for created in self.dates(count)
+        ))
+
+    def follows(self, average):
+        """Каждый подписан в среднем на ``average`` авторов,
+        популярных выбирают чаще."""
+        def generate():
+            for user_id in self.user_ids:
+                wanted = min(
+                    int(self.rng.expovariate(1 / average)),
+                    len(self.authors) - 1,
+                )
+                chosen = set()
+                while len(chosen) < wanted:
+                    author_id = self.pick_author()
+                    if author_id != user_id:
+                        chosen.add(author_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+        self.insert(Follow, generate(), ignore_conflicts=True)
+
+    def run(self, users, posts, groups, comments, follows):
+        steps = (
+            ('пользователи', lambda: self.users(users)),
+            ('группы', lambda: self.groups(groups)),
+            ('посты', lambda: self.posts(posts)),
+            ('комментарии', lambda: self.comments(comments)),
+            ('подписки', lambda: self.follows(follows)),
+            ('счётчики', counters.recount),
+            ('ленты подписок', feed.fill),
+            ('поисковый индекс', search.rebuild),
+            ('ветки комментариев', threads.rebuild),
+        )
+        with manual_dates():
+            for name, step in steps:
+                self.log(f'Генерация: {name}')
+                with transaction.atomic():
+                    step()
+        cache.clear()
+
+
+def dataset_size():
+    return {
+        'users': User.objects.count(),
+        'posts': Post.objects.count(),
+        'groups': Group.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+        'feed_entries': FeedEntry.objects.count(),
+    }
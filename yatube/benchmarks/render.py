@@ -0,0 +1,101 @@
+"""Время рендеринга страниц с лентами постов.
+
+Режимы: ``before`` — шаблоны читаются и компилируются на каждый
+запрос, карточки рендерятся заново; ``cached_loader`` — кешируются
+скомпилированные шаблоны; ``after`` — вдобавок карточки берутся из
+кеша фрагментов. Время шаблонов и всего запроса берётся из заголовка
+``Server-Timing``. Страничный кеш обходится: перед запросом поколения
+страниц увеличиваются, а поколения постов остаются прежними.
+"""
+import random
+
+from core.cache import bump_generation
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import resolve
+
+from .run import Clients, percentile
+from .scenarios import Sample, follow_index, group_posts, index, profile
+
+PAGES = {
+    'index': index,
+    'group_posts': group_posts,
+    'profile': profile,
+    'follow_index': follow_index,
+}
+MODES = {
+    'before': {'cached_loader': False, 'fragments': False},
+    'cached_loader': {'cached_loader': True, 'fragments': False},
+    'after': {'cached_loader': True, 'fragments': True},
+}
+
+
+def templates(cached_loader):
+    loaders = settings.TEMPLATE_LOADERS
+    if cached_loader:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    engine = settings.TEMPLATES[0]
+    return [{**engine, 'OPTIONS': {**engine['OPTIONS'], 'loaders': loaders}}]
+
+
+def server_timing(response):
+    durations = {}
+    for metric in response.get('Server-Timing', '').split(','):
+        name, *params = metric.strip().split(';')
+        for param in params:
+            if param.startswith('dur='):
+                durations[name] = float(param[4:])
+    return durations
+
+
+def skip_page_cache(path):
+    slug = resolve(path).kwargs.get('slug')
+    bump_generation('posts', *([f'group:{slug}'] if slug else []))
+
+
+def run_page(scenario, sample, rng, iterations, warmup):
+    clients = Clients()
+    template_ms, total_ms = [], []
+    for number in range(warmup + iterations):
+        user_id, method, path, data = scenario(rng, sample)
+        skip_page_cache(path)
+        response = getattr(clients[user_id], method)(path, data)
+        if number < warmup:
+            continue
+        durations = server_timing(response)
+        template_ms.append(durations['tpl'])
+        total_ms.append(durations['total'])
+    return {
+        'template_ms': {
+            'p50': percentile(template_ms, 0.5),
+            'p90': percentile(template_ms, 0.9),
+        },
+        'total_ms': {
+            'p50': percentile(total_ms, 0.5),
+            'p90': percentile(total_ms, 0.9),
+        },
+    }
+
+
+def compare_rendering(iterations=100, warmup=20, seed=42):
+    """Прогоняет страницы во всех режимах с одинаковой
+    последовательностью запросов."""
+    sample = Sample()
+    results = {}
+    for mode, options in MODES.items():
+        cache.clear()
+        with override_settings(
+            TEMPLATES=templates(options['cached_loader']),
+            POST_CARD_CACHE=options['fragments'],
+        ):
+            results[mode] = {
+                name: run_page(
+                    scenario, sample, random.Random(seed), iterations, warmup
+                )
+                for name, scenario in PAGES.items()
+            }
+    return {
+        'meta': {'iterations': iterations, 'warmup': warmup, 'seed': seed},
+        'modes': results,
+    }
@@ -0,0 +1,150 @@
+"""Прогон сценариев через тестовый клиент Django и сравнение прогонов."""
+import json
+import platform
+import random
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from .generate import dataset_size
+from .scenarios import SCENARIOS, Sample
+
+User = get_user_model()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def summarize(latencies, queries, errors):
+    total = sum(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / total, 2) if total else None,
+        'latency_ms': {
+            'mean': round(total / len(latencies) * 1000, 3),
+            'p50': round(percentile(latencies, 0.5) * 1000, 3),
+            'p90': round(percentile(latencies, 0.9) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'max': round(max(latencies) * 1000, 3),
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        },
+    }
+
+
+class Clients(dict):
+    """Клиенты с выполненным входом, по одному на пользователя."""
+
+    def __missing__(self, user_id):
+        client = self[user_id] = Client()
+        if user_id is not None:
+            client.force_login(User.objects.get(pk=user_id))
+        return client
+
+
+def run_scenario(scenario, sample, rng, iterations, warmup, cold):
+    clients = Clients()
+    latencies, queries, errors = [], [], 0
+    for index in range(warmup + iterations):
+        user_id, method, path, data = scenario(rng, sample)
+        client = clients[user_id]
+        if cold:
+            cache.clear()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data)
+            elapsed = time.perf_counter() - start
+        if index < warmup:
+            continue
+        latencies.append(elapsed)
+        queries.append(counter.count)
+        errors += response.status_code >= 400
+    return summarize(latencies, queries, errors)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(names=None, iterations=200, warmup=20, seed=42, cold=False):
+    """Прогоняет сценарии ``names`` (по умолчанию все) и возвращает
+    результаты в виде словаря для JSON."""
+    rng = random.Random(seed)
+    sample = Sample()
+    results = {}
+    for name in names or SCENARIOS:
+        results[name] = run_scenario(
+            SCENARIOS[name], sample, rng, iterations, warmup, cold
+        )
+    return {
+        'meta': {
+            'timestamp': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache_mode': settings.CACHE_MODE,
+            'search_backend': settings.SEARCH_BACKEND,
+            'iterations': iterations,
+            'warmup': warmup,
+            'seed': seed,
+            'cold_cache': cold,
+            'dataset': dataset_size(),
+        },
+        'scenarios': results,
+    }
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(results, output, ensure_ascii=False, indent=2)
+
+
+def compare(old, new, threshold=10):
+    """Сравнивает два прогона; возвращает строки отчёта и список
+    сценариев, у которых медиана задержки выросла больше ``threshold``
+    процентов."""
+    lines, regressions = [], []
+    for name, current in new['scenarios'].items():
+        previous = old['scenarios'].get(name)
+        if previous is None:
+            continue
+        before = previous['latency_ms']['p50']
+        after = current['latency_ms']['p50']
+        change = (after - before) / before * 100 if before else 0
+        lines.append(
+            f'{name:<14} p50 {before:>9.2f} -> {after:>9.2f} ms '
+            f'({change:+.1f}%), запросов {previous["queries"]["mean"]} '
+            f'-> {current["queries"]["mean"]}'
+        )
+        if change > threshold:
+            regressions.append(name)
+    return lines, regressions
@@ -0,0 +1,82 @@
+"""Сценарии бенчмарка: какой запрос и от чьего имени отправить.
+
+Сценарий получает генератор случайных чисел и выборку ``Sample`` и
+возвращает ``(user_id, method, path, data)``; ``user_id`` равен None
+для анонимного запроса.
+"""
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max, Min
+from django.urls import reverse
+
+from posts.models import Group, Post, UserStats
+
+User = get_user_model()
+
+
+class Sample:
+    """Идентификаторы, из которых сценарии выбирают цели запросов."""
+
+    def __init__(self):
+        bounds = Post.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        self.first_post, self.last_post = bounds['first'], bounds['last']
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.user_ids = list(User.objects.values_list('pk', flat=True))
+        authors = list(UserStats.objects.filter(
+            posts_count__gt=0
+        ).values_list('user__username', 'posts_count'))
+        self.authors = [username for username, _ in authors]
+        # Профили популярных авторов открывают чаще.
+        self.author_weights = list(accumulate(count for _, count in authors))
+        self.readers = list(UserStats.objects.filter(
+            following_count__gt=0
+        ).values_list('user_id', flat=True))
+
+    def post_id(self, rng):
+        return rng.randint(self.first_post, self.last_post)
+
+    def author(self, rng):
+        return rng.choices(self.authors, cum_weights=self.author_weights)[0]
+
+
+def index(rng, sample):
+    return None, 'get', reverse('posts:index'), None
+
+
+def group_posts(rng, sample):
+    slug = rng.choice(sample.slugs)
+    return None, 'get', reverse('posts:group_list', args=(slug,)), None
+
+
+def profile(rng, sample):
+    username = sample.author(rng)
+    return None, 'get', reverse('posts:profile', args=(username,)), None
+
+
+def post_detail(rng, sample):
+    path = reverse('posts:post_detail', args=(sample.post_id(rng),))
+    return None, 'get', path, None
+
+
+def follow_index(rng, sample):
+    return rng.choice(sample.readers), 'get', reverse(
+        'posts:follow_index'
+    ), None
+
+
+def add_comment(rng, sample):
+    path = reverse('posts:add_comment', args=(sample.post_id(rng),))
+    return rng.choice(sample.user_ids), 'post', path, {
+        'text': 'Комментарий из бенчмарка',
+    }
+
+
+SCENARIOS = {
+    'index': index,
+    'group_posts': group_posts,
+    'profile': profile,
+    'post_detail': post_detail,
+    'follow_index': follow_index,
+    'add_comment': add_comment,
+}
@@ -0,0 +1,15 @@
+"""Настройки бенчмарков: отдельная база, чтобы не трогать рабочую."""
+import os
+
+# Шаблоны загружаются так же, как в боевом окружении.
+os.environ.setdefault('YATUBE_DEBUG', '0')
+
+from yatube.settings import *  # noqa: E402,F401,F403
+from yatube.settings import BASE_DIR, DATABASES  # noqa: E402
+
+DATABASES['default']['NAME'] = os.getenv(
+    'BENCHMARK_DB', os.path.join(BASE_DIR, 'benchmarks', 'bench.sqlite3')
+)
+DEBUG = False
+QUERY_BUDGET_STRICT = False
+IMAGE_VARIANT_PROCESSES = 0
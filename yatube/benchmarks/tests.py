@@ -0,0 +1,44 @@
+from django.test import TestCase
+
+from posts.counters import recount
+from posts.models import FeedEntry, Follow
+
+from .generate import Generator, dataset_size
+from .run import compare, run
+from .scenarios import SCENARIOS
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Generator(seed=1, log=lambda message: None).run(
+            users=30, posts=200, groups=3, comments=100, follows=4
+        )
+
+    def test_generated_dataset(self):
+        """Генератор создаёт данные с согласованными счётчиками и лентами."""
+        size = dataset_size()
+
+        self.assertEqual(size['users'], 30)
+        self.assertEqual(size['posts'], 200)
+        self.assertEqual(size['groups'], 3)
+        self.assertEqual(size['comments'], 100)
+        self.assertGreater(size['follows'], 0)
+        self.assertEqual(recount(), 0)
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=follow.user, post__author=follow.author
+        ).exists())
+
+    def test_run_and_compare(self):
+        """Все сценарии проходят без ошибок, прогоны сравниваются."""
+        results = run(iterations=3, warmup=1)
+
+        self.assertEqual(set(results['scenarios']), set(SCENARIOS))
+        for name, summary in results['scenarios'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(summary['requests'], 3)
+                self.assertEqual(summary['errors'], 0)
+        lines, regressions = compare(results, results)
+        self.assertEqual(len(lines), len(SCENARIOS))
+        self.assertEqual(regressions, [])
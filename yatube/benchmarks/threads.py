@@ -0,0 +1,112 @@
+"""Загрузка веток комментариев: материализованный путь против обхода
+по ``parent``.
+
+Для каждой формы веток создаётся пост: ``deep`` — цепочки ответов
+до ``COMMENT_MAX_DEPTH``, ``wide`` — много ответов первого уровня
+и по несколько ответов на каждый. Страница веток загружается, как
+в ``post_detail`` (``threads.roots`` и ``threads.load_replies``),
+и наивно — отдельным запросом детей каждого комментария. Глубина
+раскрытия — ``COMMENT_THREAD_DEPTH`` и полная. Данные создаются
+в транзакции, которая затем откатывается.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from posts import threads
+from posts.models import Comment, Post
+
+from .run import percentile
+
+User = get_user_model()
+
+
+def shapes(roots, width):
+    depth = settings.COMMENT_MAX_DEPTH
+    return {
+        # Ширина ветки на каждом уровне после корня.
+        'deep': [1] * depth,
+        'wide': [width, 5],
+    }
+
+
+def build(author, widths, roots):
+    post = Post.objects.create(author=author, text='Ветки комментариев')
+    level = [None] * roots
+    for width in [1] + widths:
+        level = [
+            Comment.objects.create(
+                post=post, author=author, text='Ответ', parent=parent
+            )
+            for parent in level
+            for _ in range(width)
+        ]
+    return post
+
+
+def load_path(post, depth):
+    page = list(threads.roots(post).order_by('created', 'pk'))
+    return threads.load_replies(page, depth)
+
+
+def load_naive(post, depth):
+    def children(comment, level):
+        comment.replies = []
+        if level == depth:
+            return
+        for child in comment.children.for_thread().order_by('created', 'pk'):
+            comment.replies.append(child)
+            children(child, level + 1)
+
+    page = list(threads.roots(post).order_by('created', 'pk'))
+    for comment in page:
+        children(comment, 0)
+    return page
+
+
+def measure(loader, post, depth, iterations):
+    timings = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            loader(post, depth)
+            timings.append(time.perf_counter() - start)
+    return {
+        'queries': len(queries),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(timings, 0.9) * 1000, 2),
+    }
+
+
+def compare_threads(roots=20, width=20, iterations=20):
+    depths = {
+        'page': settings.COMMENT_THREAD_DEPTH,
+        'full': settings.COMMENT_MAX_DEPTH,
+    }
+    results = {}
+    with transaction.atomic():
+        author = User.objects.create(username='thread_benchmark')
+        for shape, widths in shapes(roots, width).items():
+            post = build(author, widths, roots)
+            results[shape] = {
+                f'{name}_{label}': measure(
+                    loader, post, depth, iterations
+                )
+                for label, depth in depths.items()
+                for name, loader in (('path', load_path),
+                                     ('naive', load_naive))
+            }
+            results[shape]['comments'] = post.comments.count()
+        transaction.set_rollback(True)
+    return {
+        'meta': {
+            'roots': roots,
+            'width': width,
+            'iterations': iterations,
+            'depths': depths,
+        },
+        'shapes': results,
+    }
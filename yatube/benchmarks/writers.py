@@ -0,0 +1,199 @@
+"""Одновременные писатели и читатели на SQLite.
+
+Потоки-писатели отправляют ``add_comment``, потоки-читатели открывают
+страницы постов; каждый поток работает со своим соединением, как поток
+WSGI-сервера. Профиль ``default`` повторяет настройки Django по
+умолчанию: журнал отката, ``synchronous=FULL``, соединение на каждый
+запрос. Профиль ``tuned`` — ``SQLITE_PRAGMAS`` и ``CONN_MAX_AGE``
+из настроек проекта, ``buffered`` — вдобавок отложенная запись
+комментариев (``posts.ingest``) с потоком, который сбрасывает журнал
+раз в ``COMMENT_FLUSH_INTERVAL``; для него считается и задержка
+вставки.
+"""
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.contrib.auth import get_user_model
+from django.test import Client, override_settings
+
+from posts import ingest
+
+from .concurrency import summarize
+from .scenarios import Sample, add_comment, post_detail
+
+PROFILES = {
+    'default': {
+        'conn_max_age': 0,
+        'pragmas': {
+            'journal_mode': 'delete',
+            'synchronous': 'full',
+            'mmap_size': 0,
+            'busy_timeout': 5000,
+        },
+    },
+    'tuned': {
+        'conn_max_age': settings.CONN_MAX_AGE,
+        'pragmas': settings.SQLITE_PRAGMAS,
+    },
+    'buffered': {
+        'conn_max_age': settings.CONN_MAX_AGE,
+        'pragmas': settings.SQLITE_PRAGMAS,
+        'ingest': 'buffered',
+    },
+}
+# Писатели выбираются из первых USERS пользователей; их сессии
+# создаются до замера, чтобы вход не попадал в запись комментариев.
+USERS = 50
+
+User = get_user_model()
+
+
+def sessions(user_ids):
+    keys = {}
+    for user_id in user_ids:
+        client = Client()
+        client.force_login(User.objects.get(pk=user_id))
+        keys[user_id] = client.session.session_key
+    return keys
+
+
+class SessionClients(dict):
+    def __init__(self, session_keys):
+        super().__init__()
+        self.session_keys = session_keys
+
+    def __missing__(self, user_id):
+        client = self[user_id] = Client()
+        if user_id is not None:
+            client.cookies[settings.SESSION_COOKIE_NAME] = (
+                self.session_keys[user_id]
+            )
+        return client
+
+
+def client_loop(scenario, sample, seed, deadline, results):
+    rng = random.Random(seed)
+    clients = SessionClients(sample.session_keys)
+    try:
+        while time.perf_counter() < deadline:
+            user_id, method, path, data = scenario(rng, sample)
+            client = clients[user_id]
+            start = time.perf_counter()
+            try:
+                status = getattr(client, method)(path, data).status_code
+            except OperationalError:
+                status = 503
+            results.append((time.perf_counter() - start, status))
+    finally:
+        connection.close()
+
+
+def flusher(stop):
+    try:
+        while not stop.wait(settings.COMMENT_FLUSH_INTERVAL):
+            ingest.flush()
+        ingest.flush()
+    finally:
+        connection.close()
+
+
+def run_buffered(sample, writers, readers, duration, seed):
+    buffer_dir = tempfile.mkdtemp()
+    stop = threading.Event()
+    thread = threading.Thread(target=flusher, args=(stop,))
+    try:
+        # Отложенная запись включается только с общим кешем.
+        with override_settings(
+            COMMENT_INGEST='buffered',
+            COMMENT_BUFFER_DIR=buffer_dir,
+            CACHES={'default': {
+                'BACKEND': 'core.cache_backends.SQLiteCache',
+                'LOCATION': os.path.join(buffer_dir, 'cache.sqlite3'),
+            }},
+        ):
+            thread.start()
+            try:
+                results = run_threads(
+                    sample, writers, readers, duration, seed
+                )
+            finally:
+                stop.set()
+                thread.join()
+            stats = ingest.stats()
+    finally:
+        shutil.rmtree(buffer_dir, ignore_errors=True)
+    results['flush'] = {
+        'flushed': stats['flushed'],
+        'mean_lag_ms': round(
+            stats['total_lag_s'] / max(stats['flushed'], 1) * 1000, 1
+        ),
+        'max_lag_ms': round(stats['max_lag_s'] * 1000, 1),
+    }
+    return results
+
+
+def run_profile(profile, writers, readers, duration, seed):
+    options = PROFILES[profile]
+    database = connections.databases['default']
+    previous_age = database['CONN_MAX_AGE']
+    database['CONN_MAX_AGE'] = options['conn_max_age']
+    run = run_buffered if options.get('ingest') else run_threads
+    try:
+        with override_settings(SQLITE_PRAGMAS=options['pragmas']):
+            # Режим журнала переключается, пока других соединений нет.
+            connection.close()
+            connection.ensure_connection()
+            sample = Sample()
+            sample.user_ids = sample.user_ids[:USERS]
+            sample.session_keys = sessions(sample.user_ids)
+            connection.close()
+            return run(sample, writers, readers, duration, seed)
+    finally:
+        database['CONN_MAX_AGE'] = previous_age
+
+
+def run_threads(sample, writers, readers, duration, seed):
+    results = {'writes': [], 'reads': []}
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client_loop, args=(
+            scenario, sample, seed + number, deadline, results[kind]
+        ))
+        for number, (kind, scenario) in enumerate(
+            [('writes', add_comment)] * writers
+            + [('reads', post_detail)] * readers
+        )
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return {
+        kind: summarize(*zip(*measured), wall)
+        for kind, measured in results.items() if measured
+    }
+
+
+def compare_profiles(writers=8, readers=8, duration=10, seed=42):
+    if connection.vendor != 'sqlite':
+        raise ValueError('Бенчмарк профилей рассчитан на SQLite')
+    return {
+        'meta': {
+            'writers': writers,
+            'readers': readers,
+            'duration_s': duration,
+            'seed': seed,
+        },
+        'profiles': {
+            profile: run_profile(profile, writers, readers, duration, seed)
+            for profile in PROFILES
+        },
+    }
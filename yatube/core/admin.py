@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'task', 'status', 'priority', 'attempts', 'run_after',
+        'locked_by',
+    )
+    list_filter = ('status', 'task')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        queryset.update(
+            status=Job.PENDING,
+            attempts=0,
+            run_after=timezone.now(),
+            locked_at=None,
+            locked_by='',
+        )
+    retry.short_description = 'Повторить выбранные задания'
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite)
+        # Регистрирует фоновые задачи из tasks.py всех приложений.
+        autodiscover_modules('tasks')
@@ -0,0 +1,129 @@
+"""ASGI-обёртка над WSGI-приложением.
+
+В Django 2.2 нет ни ASGI-обработчика, ни асинхронных представлений,
+поэтому приложение по-прежнему выполняется синхронно в пуле потоков.
+Обёртка снимает с этих потоков работу с медленными клиентами: тело
+запроса принимается, а ответ отдаётся в цикле событий ASGI-сервера,
+и поток занят только на время работы Django.
+
+Ответ собирается в потоке целиком, поэтому потоковые ответы
+(``StreamingHttpResponse``, раздача файлов) буферизуются в памяти.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+BODY_MEMORY_LIMIT = 1024 * 1024
+
+
+def build_environ(scope, body):
+    """WSGI-окружение для HTTP-запроса ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', ()):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = raw_value.decode('latin-1')
+        if name in environ:
+            # Cookie склеиваются через «; » (RFC 6265), остальные
+            # повторённые заголовки — через запятую.
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    return environ
+
+
+def run_wsgi(application, environ):
+    """Выполняет WSGI-приложение и возвращает ответ целиком."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers
+        ]
+
+    result = application(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+class WsgiToAsgi:
+    def __init__(self, application, max_workers=None):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        try:
+            status, headers, content = await asyncio.get_running_loop(
+            ).run_in_executor(
+                self.executor,
+                run_wsgi,
+                self.application,
+                build_environ(scope, body),
+            )
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def read_body(self, receive):
+        """Принимает тело запроса; None, если клиент отключился."""
+        body = SpooledTemporaryFile(max_size=BODY_MEMORY_LIMIT)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        return body
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
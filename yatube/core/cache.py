@@ -0,0 +1,97 @@
+"""Кеширование с версионированными ключами.
+
+Для каждой области (``posts``, ``group:<slug>`` и т. п.) в кеше хранится
+номер поколения. Он входит в ключ закешированной страницы, поэтому
+страница живёт долго и устаревает сразу, как только сигнал изменения
+данных увеличит поколение её области.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.cache import CacheMiddleware
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import metrics
+
+GENERATION_KEY = 'generation:{}'
+
+
+def _initial_generation():
+    # Если счётчик вытеснен из кеша, новое значение не должно совпасть
+    # со старым, поэтому начинаем с текущего времени.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    stored = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in stored:
+            cache.add(key, _initial_generation(), None)
+            stored[key] = cache.get(key)
+        generations.append(stored[key])
+    return generations
+
+
+def bump_generation(*scopes):
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+
+
+def generation_stamp(*scopes):
+    return '.'.join(str(value) for value in get_generations(*scopes))
+
+
+def cache_page_versioned(key_prefix, scopes, timeout=None):
+    """Аналог ``cache_page``, ключ которого зависит от поколений
+    областей ``scopes(request, *args, **kwargs)``."""
+    if timeout is None:
+        timeout = settings.CACHE_PAGE_TIMEOUT
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            stamp = generation_stamp(*scopes(request, *args, **kwargs))
+            middleware = CacheMiddleware(
+                cache_timeout=timeout,
+                key_prefix=f'{key_prefix}:{stamp}',
+            )
+            response = middleware.process_request(request)
+            metrics.record_cache(response is not None)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                # В странице меню и CSRF-токен посетителя, поэтому ключ
+                # зависит от cookie. SessionMiddleware добавляет Vary
+                # позже, уже после записи в кеш.
+                patch_vary_headers(response, ('Cookie',))
+                response = middleware.process_response(request, response)
+            # Страница хранится на сервере долго, а клиент должен
+            # каждый раз перепроверять её по ETag.
+            if 'Expires' in response:
+                del response['Expires']
+            patch_cache_control(response, max_age=0, must_revalidate=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def generation_etag(scopes):
+    """Функция ETag для ``condition``: зависит от поколений областей,
+    адреса страницы и посетителя, страницу не рендерит."""
+    def etag(request, *args, **kwargs):
+        parts = (
+            request.get_full_path(),
+            str(request.user.pk),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            generation_stamp(*scopes(request, *args, **kwargs)),
+        )
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return etag
@@ -0,0 +1,311 @@
+"""Бэкенды кеша, общие для всех процессов сервера.
+
+``SQLiteCache`` хранит записи в файле SQLite (WAL, mmap), который
+видят все воркеры на машине. ``TwoTierCache`` держит перед общим кешем
+небольшой LRU в памяти процесса: горячие ключи отдаются из памяти.
+
+Удаление и инкремент ключа пишут его в журнал инвалидаций в общем
+кеше (порядковый номер и запись на номер), и каждый процесс не реже
+раза в ``CHECK_INTERVAL`` секунд убирает из памяти только эти ключи.
+Если процесс отстал больше чем на ``LOG_SIZE`` записей или запись
+журнала пропала, он сбрасывает локальный слой целиком; ``clear``
+сбрасывает его во всех процессах через счётчик эпохи.
+
+``set`` журнал не пишет: другой процесс может отдавать свою прежнюю
+копию ключа до ``LOCAL_TIMEOUT`` секунд. Страницы и фрагменты это не
+задевает — их ключи содержат поколение, и новое значение ложится под
+новый ключ; ключ, который перезаписывается на месте и должен сразу
+читаться везде, нужно удалять или менять через ``incr``.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    cull_every = 64
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._mmap_size = options.get('MMAP_SIZE', 64 * 1024 * 1024)
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA mmap_size={int(self._mmap_size)}')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _dumps(self, value):
+        return sqlite3.Binary(pickle.dumps(value, self.pickle_protocol))
+
+    def _fresh(self, expires):
+        return expires is None or expires > time.time()
+
+    def _after_write(self, connection):
+        self._writes += 1
+        if self._writes % self.cull_every:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),),
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or not self._fresh(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, self._dumps(value), expires),
+        )
+        self._after_write(connection)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, self._dumps(value), expires),
+            ).rowcount
+        self._after_write(connection)
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._fresh(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), key),
+            )
+        return value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+class TwoTierCache(BaseCache):
+    epoch_key = 'two_tier_cache_epoch'
+    sequence_key = 'two_tier_cache_sequence'
+    log_key = 'two_tier_cache_log:{}'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._check_interval = options.get('CHECK_INTERVAL', 1)
+        self._log_size = options.get('LOG_SIZE', 1000)
+        self._log_timeout = options.get('LOG_TIMEOUT', 60)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._sequence = 0
+        self._checked = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _sync(self):
+        """Убирает из памяти ключи, изменённые другими процессами."""
+        now = time.monotonic()
+        if now - self._checked < self._check_interval:
+            return
+        state = self.shared.get_many((self.epoch_key, self.sequence_key))
+        epoch = state.get(self.epoch_key)
+        sequence = state.get(self.sequence_key, 0)
+        with self._lock:
+            seen = self._sequence
+        stale = self._stale_keys(seen, sequence)
+        with self._lock:
+            if epoch != self._epoch or stale is None:
+                self._entries.clear()
+            else:
+                for local_key in stale:
+                    self._entries.pop(local_key, None)
+            self._epoch = epoch
+            self._sequence = sequence
+            self._checked = now
+
+    def _stale_keys(self, seen, sequence):
+        """Ключи из журнала после ``seen`` или None, если журнал
+        прочитать целиком нельзя."""
+        if sequence == seen:
+            return ()
+        if not 0 < sequence - seen <= self._log_size:
+            return None
+        log_keys = [
+            self.log_key.format(number)
+            for number in range(seen + 1, sequence + 1)
+        ]
+        entries = self.shared.get_many(log_keys)
+        if len(entries) < len(log_keys):
+            return None
+        return entries.values()
+
+    def _invalidate(self, local_key):
+        self._forget(local_key)
+        try:
+            sequence = self.shared.incr(self.sequence_key)
+        except ValueError:
+            self.shared.add(self.sequence_key, 0, None)
+            sequence = self.shared.incr(self.sequence_key)
+        self.shared.set(
+            self.log_key.format(sequence), local_key, self._log_timeout
+        )
+
+    def _bump_epoch(self):
+        epoch = uuid.uuid4().hex
+        self.shared.set(self.epoch_key, epoch, None)
+        with self._lock:
+            self._epoch = epoch
+            self._sequence = 0
+
+    def _remember(self, local_key, value):
+        expires = time.monotonic() + self._local_timeout
+        with self._lock:
+            self._entries[local_key] = (pickle.dumps(value), expires)
+            self._entries.move_to_end(local_key)
+            while len(self._entries) > self._local_max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, local_key):
+        with self._lock:
+            self._entries.pop(local_key, None)
+
+    def _get_local(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        with self._lock:
+            entry = self._entries.get(local_key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(local_key)
+                return pickle.loads(entry[0])
+        return default
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        value = self._get_local(key, MISSING, version=version)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            return default
+        self._remember(self._local_key(key, version), value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._remember(self._local_key(key, version), value)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._remember(self._local_key(key, version), value)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._invalidate(self._local_key(key, version))
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._invalidate(self._local_key(key, version))
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._entries.clear()
+        self._bump_epoch()
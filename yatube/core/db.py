@@ -0,0 +1,19 @@
+"""Настройка новых соединений с базой.
+
+SQLite по умолчанию ведёт журнал отката, и запись блокирует чтение.
+Обработчик ``connection_created`` выполняет для каждого соединения
+PRAGMA из ``SQLITE_PRAGMAS``: в режиме WAL читатели не ждут писателя,
+``synchronous=NORMAL`` в WAL не портит базу при падении процесса,
+``mmap_size`` читает файл через отображение в память, а
+``busy_timeout`` заставляет ждать блокировку вместо немедленной
+ошибки ``database is locked``.
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,235 @@
+"""Очередь фоновых заданий в базе данных.
+
+Задачи объявляются декоратором ``task`` в модулях ``tasks.py``
+приложений и ставятся в очередь вызовом ``.delay()``. Строка ``Job``
+пишется в текущей транзакции, поэтому задание появляется только вместе
+с данными, которые его породили, и не теряется при перезапуске.
+
+Выполняет задания команда ``manage.py run_worker``. Задание
+захватывается условным ``UPDATE``, так что несколько воркеров не
+возьмут его дважды ни на SQLite, ни на PostgreSQL. Упавшее задание
+повторяется с удваивающейся задержкой, пока не кончатся попытки;
+задание воркера, умершего на середине, снова становится доступно через
+``JOBS_LOCK_TIMEOUT`` секунд. Выполненные задания удаляются.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    def __init__(self, func, priority, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Ставит вызов задачи в очередь; аргументы — JSON."""
+        return self.enqueue(args, kwargs)
+
+    def delay_once(self, *args, **kwargs):
+        """Как ``delay``, но если такой же вызов ещё ждёт в очереди,
+        второй не ставится и возвращается None."""
+        if Job.objects.filter(
+            task=self.name,
+            status=Job.PENDING,
+            payload=_payload(args, kwargs),
+        ).exists():
+            return None
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, priority=None, countdown=0):
+        return Job.objects.create(
+            task=self.name,
+            payload=_payload(args, kwargs),
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts or settings.JOBS_MAX_ATTEMPTS,
+            run_after=timezone.now() + timedelta(seconds=countdown),
+        )
+
+
+def _payload(args, kwargs):
+    return json.dumps({'args': list(args), 'kwargs': kwargs or {}})
+
+
+def task(priority=0, max_attempts=None):
+    """Регистрирует функцию как фоновую задачу.
+
+    Задачи с большим ``priority`` выполняются раньше.
+    """
+    def decorator(func):
+        registered = Task(func, priority, max_attempts)
+        registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit=1):
+    """Захватывает до ``limit`` готовых к запуску заданий.
+
+    Возвращает их ``id`` в порядке приоритета.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    candidates = Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now)
+        | Q(status=Job.RUNNING, locked_at__lt=stale)
+    ).values_list('pk', 'status', 'locked_at')[:limit * 2]
+    claimed = []
+    for pk, status, locked_at in candidates:
+        taken = Job.objects.filter(
+            pk=pk, status=status, locked_at=locked_at
+        ).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            claimed.append(pk)
+        if len(claimed) == limit:
+            break
+    return claimed
+
+
+def retry_delay(attempts):
+    return settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def fail(job, error):
+    """Возвращает задание в очередь или, если попытки кончились,
+    помечает его ошибочным."""
+    changes = {'locked_at': None, 'locked_by': '', 'error': error}
+    if job.attempts >= job.max_attempts:
+        changes['status'] = Job.FAILED
+    else:
+        changes['status'] = Job.PENDING
+        changes['run_after'] = timezone.now() + timedelta(
+            seconds=retry_delay(job.attempts)
+        )
+    Job.objects.filter(pk=job.pk).update(**changes)
+
+
+def execute(job_id):
+    """Выполняет захваченное задание; возвращает True при успехе."""
+    job = Job.objects.get(pk=job_id)
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Попытки исчерпаны')
+        payload = json.loads(job.payload)
+        registry[job.task](*payload['args'], **payload['kwargs'])
+    except Exception as error:
+        logger.exception('Задание %s (%s) упало', job.pk, job.task)
+        fail(job, repr(error))
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def execute_in_pool(job_id):
+    # Потоки и процессы пула живут долго, как воркеры веб-сервера:
+    # соединения с базой закрываются так же, как между запросами.
+    close_old_connections()
+    try:
+        return execute(job_id)
+    finally:
+        close_old_connections()
+
+
+def run_pending(limit=None, worker=None):
+    """Выполняет готовые задания в текущем потоке, пока они есть.
+
+    Возвращает число успешно выполненных.
+    """
+    worker = worker or worker_name()
+    done = processed = 0
+    while limit is None or processed < limit:
+        claimed = claim(worker)
+        if not claimed:
+            break
+        done += execute(claimed[0])
+        processed += 1
+    return done
+
+
+class Worker:
+    """Цикл воркера: забирает задания и раздаёт их пулу потоков или
+    процессов, не больше ``concurrency`` одновременно."""
+
+    def __init__(self, concurrency=4, processes=False, burst=False,
+                 poll_interval=None):
+        self.concurrency = concurrency
+        self.processes = processes
+        self.burst = burst
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.name = worker_name()
+        self.stopping = False
+        self.done = self.failed = 0
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def pool(self):
+        if self.processes:
+            return ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix='jobs'
+        )
+
+    def run(self):
+        running = set()
+        with self.pool() as pool:
+            while not self.stopping or running:
+                free = self.concurrency - len(running)
+                if free and not self.stopping:
+                    for job_id in claim(self.name, free):
+                        running.add(pool.submit(execute_in_pool, job_id))
+                if not running:
+                    if self.burst:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                finished, running = wait(
+                    running,
+                    timeout=self.poll_interval,
+                    return_when=FIRST_COMPLETED,
+                )
+                self.count(finished)
+        close_old_connections()
+
+    def count(self, finished):
+        for future in finished:
+            if future.result():
+                self.done += 1
+            else:
+                self.failed += 1
@@ -0,0 +1,15 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .tasks import send_email, serialize_message
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Ставит письма в очередь заданий вместо отправки в запросе.
+
+    Отправляет их воркер через ``EMAIL_DELIVERY_BACKEND``.
+    """
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            send_email.delay(serialize_message(message))
+        return len(email_messages)
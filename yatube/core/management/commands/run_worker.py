@@ -0,0 +1,43 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задания фоновой очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Сколько заданий выполнять одновременно',
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо потоков (для задач, нагружающих CPU)',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда очередь опустеет',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help='Пауза между опросами пустой очереди, секунд',
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=max(options['concurrency'], 1),
+            processes=options['processes'],
+            burst=options['burst'],
+            poll_interval=options['poll_interval'],
+        )
+        # Текущие задания доделываются, новые не берутся.
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stderr.write(f'Воркер {worker.name} запущен')
+        worker.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено: {worker.done}, с ошибкой: {worker.failed}'
+        ))
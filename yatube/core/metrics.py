@@ -0,0 +1,192 @@
+"""Метрики запросов: число и время SQL-запросов, время рендеринга
+шаблонов, попадания в кеш страниц.
+
+``RequestMetricsMiddleware`` собирает метрики каждого запроса, отдаёт
+их в заголовке ``Server-Timing`` и копит гистограммы по имени URL
+(в памяти процесса), которые показывает ``core.views.request_metrics``.
+Лимиты запросов к базе задаются в ``QUERY_BUDGETS``.
+
+Гистограммы не общие для процессов: при нескольких воркерах страница
+метрик показывает только тот, который обслужил её запрос, и после
+перезапуска процесса счёт начинается заново.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_depth = 0
+
+
+def current():
+    """Метрики обрабатываемого запроса или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+def record_cache(hit):
+    metrics = current()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+@contextmanager
+def template_timer():
+    # Вложенные шаблоны уже входят во время внешнего.
+    metrics = current()
+    if metrics is None or metrics.template_depth:
+        yield
+        return
+    metrics.template_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_time += time.perf_counter() - start
+        metrics.template_depth -= 1
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = current()
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.sql_time += time.perf_counter() - start
+
+
+def _bucket(buckets, value):
+    for bound in buckets:
+        if value <= bound:
+            return str(bound)
+    return '+Inf'
+
+
+def _histogram(buckets):
+    return dict.fromkeys([*map(str, buckets), '+Inf'], 0)
+
+
+def _record(view_name, metrics, duration):
+    with _lock:
+        entry = _stats.setdefault(view_name, {
+            'requests': 0,
+            'duration_ms': _histogram(DURATION_BUCKETS),
+            'queries': _histogram(QUERY_BUCKETS),
+            'total_ms': 0.0,
+            'sql_ms': 0.0,
+            'template_ms': 0.0,
+            'max_queries': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'over_budget': 0,
+        })
+        entry['requests'] += 1
+        entry['duration_ms'][_bucket(DURATION_BUCKETS, duration * 1000)] += 1
+        entry['queries'][_bucket(QUERY_BUCKETS, metrics.queries)] += 1
+        entry['total_ms'] += duration * 1000
+        entry['sql_ms'] += metrics.sql_time * 1000
+        entry['template_ms'] += metrics.template_time * 1000
+        entry['max_queries'] = max(entry['max_queries'], metrics.queries)
+        entry['cache_hits'] += metrics.cache_hits
+        entry['cache_misses'] += metrics.cache_misses
+        return entry
+
+
+def snapshot():
+    """Копия накопленной статистики по именам URL."""
+    with _lock:
+        return {
+            name: {
+                key: dict(value) if isinstance(value, dict) else value
+                for key, value in entry.items()
+            }
+            for name, entry in _stats.items()
+        }
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def server_timing(metrics, duration):
+    parts = [
+        'db;dur={:.1f};desc="SQL: {} queries"'.format(
+            metrics.sql_time * 1000, metrics.queries
+        ),
+        'tpl;dur={:.1f};desc="Templates"'.format(
+            metrics.template_time * 1000
+        ),
+    ]
+    if metrics.cache_hits or metrics.cache_misses:
+        parts.append('cache;desc="{}"'.format(
+            'hit' if metrics.cache_hits else 'miss'
+        ))
+    parts.append('total;dur={:.1f}'.format(duration * 1000))
+    return ', '.join(parts)
+
+
+def over_budget(view_name, queries, budget):
+    message = f'{view_name}: {queries} SQL-запросов при лимите {budget}'
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_sql_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        entry = _record(view_name, metrics, duration)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(metrics, duration)
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and metrics.queries > budget:
+            with _lock:
+                entry['over_budget'] += 1
+            over_budget(view_name, metrics.queries, budget)
+        return response
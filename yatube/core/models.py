@@ -9,3 +9,76 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Job(models.Model):
+    """Задание фоновой очереди (см. ``core.jobs``)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(
+        verbose_name='Задача',
+        max_length=200,
+    )
+    payload = models.TextField(
+        verbose_name='Аргументы',
+        default='{}',
+    )
+    priority = models.SmallIntegerField(
+        verbose_name='Приоритет',
+        default=0,
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попытки',
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток',
+    )
+    run_after = models.DateTimeField(
+        verbose_name='Не раньше',
+    )
+    locked_at = models.DateTimeField(
+        verbose_name='Захвачено',
+        null=True,
+        blank=True,
+    )
+    locked_by = models.CharField(
+        verbose_name='Воркер',
+        max_length=100,
+        blank=True,
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True,
+    )
+    created = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ('-priority', 'run_after', 'pk')
+        verbose_name = 'job'
+        verbose_name_plural = 'jobs'
+        indexes = (
+            models.Index(
+                fields=('status', '-priority', 'run_after'),
+                name='job_queue_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.task} #{self.pk}: {self.status}'
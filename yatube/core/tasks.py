@@ -0,0 +1,61 @@
+from base64 import b64decode, b64encode
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .jobs import task
+
+
+def delivery_connection():
+    """Соединение бэкенда, который действительно отправляет письма."""
+    return get_connection(settings.EMAIL_DELIVERY_BACKEND)
+
+
+def serialize_message(message):
+    """Письмо в виде словаря для JSON; вложения — только кортежами."""
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise TypeError('Вложения MIMEBase не поддерживаются')
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append(
+            (filename, b64encode(content).decode('ascii'), mimetype)
+        )
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'content_subtype': message.content_subtype,
+        'alternatives': getattr(message, 'alternatives', []),
+        'attachments': attachments,
+    }
+
+
+def deserialize_message(data):
+    message = EmailMultiAlternatives(
+        data['subject'],
+        data['body'],
+        data['from_email'],
+        data['to'],
+        data['bcc'],
+        cc=data['cc'],
+        reply_to=data['reply_to'],
+        headers=data['headers'],
+        alternatives=[tuple(item) for item in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, b64decode(content), mimetype)
+    return message
+
+
+@task(priority=10)
+def send_email(data):
+    delivery_connection().send_messages([deserialize_message(data)])
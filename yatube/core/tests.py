@@ -0,0 +1,366 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, metrics
+from .asgi import WsgiToAsgi
+from .cache_backends import TwoTierCache
+from .models import Job
+
+User = get_user_model()
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(TEMP_CACHE_DIR, 'cache.sqlite3'),
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class SharedCacheTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.shared = caches['shared']
+        self.shared.clear()
+
+    def make_worker(self, **options):
+        return TwoTierCache('', {
+            'OPTIONS': {'SHARED': 'shared', 'CHECK_INTERVAL': 0, **options},
+        })
+
+    def test_sqlite_cache_operations(self):
+        """SQLite-кеш поддерживает основные операции."""
+        self.shared.set('key', {'value': 1})
+        self.assertEqual(self.shared.get('key'), {'value': 1})
+        self.assertFalse(self.shared.add('key', 'other'))
+        self.assertTrue(self.shared.add('new_key', 'value'))
+
+        self.shared.set('counter', 1)
+        self.assertEqual(self.shared.incr('counter'), 2)
+        with self.assertRaises(ValueError):
+            self.shared.incr('missing')
+
+        self.shared.delete('key')
+        self.assertIsNone(self.shared.get('key'))
+
+        self.shared.set('expired', 'value', timeout=-1)
+        self.assertIsNone(self.shared.get('expired'))
+
+    def test_two_tier_serves_local_copy(self):
+        """Повторное чтение не ходит в общий кеш."""
+        worker = self.make_worker()
+        worker.set('page', 'content')
+        self.shared.delete('page')
+
+        self.assertEqual(worker.get('page'), 'content')
+
+    def test_two_tier_invalidation_between_workers(self):
+        """Удаление и инкремент в одном воркере видны в другом."""
+        first, second = self.make_worker(), self.make_worker()
+        first.set('page', 'content')
+        first.set('generation', 1)
+        self.assertEqual(second.get('page'), 'content')
+        self.assertEqual(second.get('generation'), 1)
+
+        first.delete('page')
+        first.incr('generation')
+
+        self.assertIsNone(second.get('page'))
+        self.assertEqual(second.get('generation'), 2)
+
+    def test_two_tier_invalidates_only_changed_keys(self):
+        """Инкремент одного ключа не сбрасывает остальные локальные
+        копии, а отставший воркер сбрасывает свой слой целиком."""
+        first = self.make_worker()
+        second = self.make_worker(LOG_SIZE=2)
+        first.set('page', 'content')
+        first.set('generation', 1)
+        self.assertEqual(second.get('page'), 'content')
+        self.assertEqual(second.get('generation'), 1)
+        self.shared.delete('page')
+
+        first.incr('generation')
+
+        self.assertEqual(second.get('page'), 'content')
+        self.assertEqual(second.get('generation'), 2)
+
+        for _ in range(3):
+            first.incr('generation')
+
+        self.assertIsNone(second.get('page'))
+        self.assertEqual(second.get('generation'), 5)
+
+    def test_two_tier_clear_reaches_other_workers(self):
+        first, second = self.make_worker(), self.make_worker()
+        first.set('page', 'content')
+        self.assertEqual(second.get('page'), 'content')
+
+        first.clear()
+
+        self.assertIsNone(second.get('page'))
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        metrics.reset()
+        self.client = Client()
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        """Ответ содержит метрики запроса в заголовке Server-Timing."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="SQL: \d+ queries", tpl;dur=[\d.]+;'
+            r'desc="Templates", cache;desc="hit", total;dur=[\d.]+$',
+        )
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        """Без SERVER_TIMING заголовок не отдаётся."""
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics_endpoint(self):
+        """Гистограммы по именам URL доступны только персоналу."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            self.client.get(reverse('request_metrics')).status_code, 302
+        )
+        self.client.force_login(User.objects.create_user(
+            username='staff', is_staff=True
+        ))
+
+        stats = self.client.get(reverse('request_metrics')).json()
+
+        index = stats['posts:index']
+        self.assertEqual(index['requests'], 2)
+        self.assertEqual(sum(index['duration_ms'].values()), 2)
+        self.assertEqual(sum(index['queries'].values()), 2)
+        self.assertEqual(index['cache_misses'], 1)
+        self.assertEqual(index['cache_hits'], 1)
+        self.assertGreater(index['template_ms'], 0)
+
+    def test_query_budget(self):
+        """Превышение лимита запросов — ошибка в строгом режиме,
+        иначе в лог."""
+        with override_settings(
+            QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_STRICT=True
+        ):
+            with self.assertRaises(metrics.QueryBudgetExceeded):
+                self.client.get(reverse('posts:index'))
+            caches['default'].clear()
+            with override_settings(QUERY_BUDGET_STRICT=False), \
+                    self.assertLogs('core.metrics', 'WARNING'):
+                self.client.get(reverse('posts:index'))
+
+        self.assertEqual(metrics.snapshot()['posts:index']['over_budget'], 2)
+
+
+class SQLiteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+    def test_wal_on_file_database(self):
+        """Файловая база переводится в режим WAL."""
+        path = os.path.join(tempfile.mkdtemp(), 'wal.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        database = dict(connection.settings_dict, NAME=path)
+        wrapper = type(connections['default'])(database, alias='wal')
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+        finally:
+            wrapper.close()
+
+
+def echo_application(environ, start_response):
+    start_response('201 Created', [('Content-Type', 'application/json')])
+    return [json.dumps({
+        'method': environ['REQUEST_METHOD'],
+        'path': environ['PATH_INFO'],
+        'query': environ['QUERY_STRING'],
+        'type': environ['CONTENT_TYPE'],
+        'cookie': environ['HTTP_COOKIE'],
+        'body': environ['wsgi.input'].read().decode(),
+    }).encode()]
+
+
+class WsgiToAsgiTests(TestCase):
+    def call(self, scope, messages):
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        application = WsgiToAsgi(echo_application, max_workers=1)
+        asyncio.run(application(scope, receive, send))
+        return sent
+
+    def test_http_request(self):
+        """Запрос ASGI передаётся WSGI-приложению, тело — частями."""
+        sent = self.call({
+            'type': 'http',
+            'method': 'POST',
+            'path': '/путь/',
+            'query_string': b'a=1',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'cookie', b'a=1'),
+                (b'cookie', b'b=2'),
+            ],
+        }, [
+            {'type': 'http.request', 'body': b'hello ', 'more_body': True},
+            {'type': 'http.request', 'body': b'world'},
+        ])
+
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertIn(
+            (b'content-type', b'application/json'), sent[0]['headers']
+        )
+        self.assertEqual(json.loads(sent[1]['body']), {
+            'method': 'POST',
+            'path': '/путь/'.encode().decode('latin-1'),
+            'query': 'a=1',
+            'type': 'text/plain',
+            'cookie': 'a=1; b=2',
+            'body': 'hello world',
+        })
+
+    def test_lifespan(self):
+        """Сервер получает подтверждение запуска и остановки."""
+        sent = self.call({'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ])
+
+        self.assertEqual(
+            [message['type'] for message in sent],
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
+
+
+calls = []
+
+
+@jobs.task()
+def record_call(value):
+    calls.append(value)
+
+
+@jobs.task(max_attempts=2)
+def always_fails():
+    raise ValueError('сбой')
+
+
+@override_settings(JOBS_RETRY_DELAY=10, JOBS_LOCK_TIMEOUT=60)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_order(self):
+        """Задания выполняются по приоритету, затем по времени."""
+        record_call.delay('first')
+        record_call.enqueue(('urgent',), priority=10)
+        record_call.delay('second')
+        record_call.enqueue(('later',), countdown=60)
+
+        self.assertEqual(jobs.run_pending(), 3)
+        self.assertEqual(calls, ['urgent', 'first', 'second'])
+        self.assertEqual(Job.objects.get().payload, json.dumps(
+            {'args': ['later'], 'kwargs': {}}
+        ))
+
+    def test_retries_with_backoff(self):
+        """Упавшее задание откладывается, затем помечается ошибкой."""
+        job = always_fails.delay()
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('сбой', job.error)
+        self.assertGreater(
+            job.run_after, timezone.now() + timedelta(seconds=5)
+        )
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(jobs.claim('test'), [])
+
+    def test_stale_job_is_reclaimed(self):
+        """Задание умершего воркера снова попадает в работу."""
+        job = record_call.delay('stale')
+        self.assertEqual(jobs.claim('dead'), [job.pk])
+        self.assertEqual(jobs.claim('alive'), [])
+
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(jobs.claim('alive'), [job.pk])
+        self.assertTrue(jobs.execute(job.pk))
+        self.assertEqual(calls, ['stale'])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_queued_email(self):
+        """Письмо уходит в очередь и отправляется воркером."""
+        message = mail.EmailMultiAlternatives(
+            'Тема', 'Текст', 'from@example.com', ['to@example.com'],
+            alternatives=[('<p>Текст</p>', 'text/html')],
+        )
+        message.attach('note.txt', 'Вложение', 'text/plain')
+        message.send()
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().task, 'core.tasks.send_email')
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.subject, 'Тема')
+        self.assertEqual(sent.to, ['to@example.com'])
+        self.assertEqual(sent.alternatives, [('<p>Текст</p>', 'text/html')])
+        self.assertEqual(
+            sent.attachments, [('note.txt', 'Вложение', 'text/plain')]
+        )
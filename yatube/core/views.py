@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +15,11 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html')
+
+
+@staff_member_required
+def request_metrics(request):
+    """Метрики запросов процесса, обслужившего этот запрос."""
+    return JsonResponse(
+        metrics.snapshot(), json_dumps_params={'ensure_ascii': False}
+    )
@@ -1,17 +1,133 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import transaction
+from django.template.response import TemplateResponse
 
+from . import search
 from .models import Comment, Follow, Group, Post
+from .utils import EstimatedCountPaginator
+
+
+def delete_in_batches(queryset, batch_size):
+    """Удаляет строки пачками по ``pk``, каждую в своей транзакции:
+    блокировка записи не держится на всё удаление, сигналы
+    срабатывают как при обычном удалении. Возвращает число удалённых."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    deleted, last = 0, None
+    while True:
+        chunk = list(
+            (pks if last is None else pks.filter(pk__gt=last))[:batch_size]
+        )
+        if not chunk:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=chunk).delete()
+        deleted += len(chunk)
+        last = chunk[-1]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список большой таблицы: без ``COUNT(*)`` по всей таблице
+    и со стандартным удалением, заменённым на удаление пачками."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('delete_selected_in_batches',)
+
+    def get_actions(self, request):
+        # Стандартное удаление строит дерево всех связанных объектов.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_selected_in_batches(self, request, queryset):
+        if not self.has_delete_permission(request):
+            return None
+        if request.POST.get('post') != 'yes':
+            context = {
+                **self.admin_site.each_context(request),
+                'title': 'Удаление пачками',
+                'opts': self.model._meta,
+                'count': EstimatedCountPaginator(queryset, 1).count,
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+                'selected': request.POST.getlist(
+                    helpers.ACTION_CHECKBOX_NAME
+                ),
+                'select_across': request.POST.get('select_across', '0'),
+            }
+            return TemplateResponse(
+                request, 'admin/batch_delete_confirmation.html', context
+            )
+        deleted = delete_in_batches(queryset, settings.ADMIN_BATCH_SIZE)
+        self.message_user(
+            request, f'Удалено записей: {deleted}', messages.SUCCESS
+        )
+        return None
+    delete_selected_in_batches.short_description = (
+        'Удалить выбранные пачками'
+    )
+    delete_selected_in_batches.allowed_permissions = ('delete',)
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    ordering = ('-pub_date', '-pk')
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE по тексту — полнотекстовый индекс.
+        if not search_term:
+            return queryset, False
+        ids = search.search_ids(search_term)
+        if not ids:
+            return queryset.none(), False
+        if len(ids) >= settings.SEARCH_MAX_RESULTS:
+            self.message_user(
+                request,
+                f'Показаны только первые {len(ids)} совпадений: '
+                'уточните запрос.',
+                messages.WARNING,
+            )
+        return queryset.filter(pk__in=ids), False
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Выпадающий список группы в каждой строке списка: варианты
+            # загружаются один раз на запрос, а не на каждую строку.
+            if not hasattr(request, '_group_choices'):
+                request._group_choices = list(iter(field.choices))
+            field.choices = request._group_choices
+        return field
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'author', 'post', 'created')
+    list_select_related = ('author', 'post')
+    date_hierarchy = 'created'
+    ordering = ('-created', '-pk')
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post', 'parent')
+
 
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+@admin.register(Follow)
+class FollowAdmin(LargeTableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    ordering = ('-pk',)
+    autocomplete_fields = ('user', 'author')
@@ -0,0 +1,134 @@
+"""Денормализованные счётчики постов, подписок и комментариев.
+
+Счётчики меняются атомарными ``UPDATE ... SET n = n + 1`` из сигналов,
+поэтому страницы профиля и поста не считают агрегаты на запросе.
+Расхождения исправляет команда ``manage.py recount_stats``.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        Value(0),
+    )
+
+
+def user_stats_values():
+    """Фактические значения счётчиков пользователей."""
+    return User.objects.annotate(
+        actual_posts=_count(Post.objects, 'author'),
+        actual_followers=_count(Follow.objects, 'author'),
+        actual_following=_count(Follow.objects, 'user'),
+    )
+
+
+def _actual_stats(user_id):
+    user = user_stats_values().get(pk=user_id)
+    return {
+        'posts_count': user.actual_posts,
+        'followers_count': user.actual_followers,
+        'following_count': user.actual_following,
+    }
+
+
+def change_user_stats(user_id, **deltas):
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    with transaction.atomic():
+        if UserStats.objects.filter(user_id=user_id).update(**updates):
+            return
+        # Уменьшение без строки её не создаёт: при удалении пользователя
+        # каскад сначала удаляет UserStats, а потом шлёт post_delete
+        # его постов и подписок. Пропущенную строку создаст stats_for
+        # или recount_stats.
+        if any(delta < 0 for delta in deltas.values()):
+            return
+        if not User.objects.filter(pk=user_id).exists():
+            return
+        # Строки ещё нет: создаём её сразу с фактическими значениями,
+        # которые уже учитывают текущее изменение.
+        _, created = UserStats.objects.get_or_create(
+            user_id=user_id, defaults=_actual_stats(user_id)
+        )
+        if not created:
+            UserStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def change_many_user_stats(user_ids, **deltas):
+    """Как ``change_user_stats``, но одним ``UPDATE`` на всех."""
+    user_ids = set(user_ids)
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    with transaction.atomic():
+        changed = UserStats.objects.filter(user_id__in=user_ids).update(
+            **updates
+        )
+        if changed == len(user_ids):
+            return
+        user_ids -= set(UserStats.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', flat=True))
+        for user_id in user_ids:
+            change_user_stats(user_id, **deltas)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def stats_for(user):
+    """Счётчики пользователя; ``user`` лучше загружать
+    с ``select_related('stats')``."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user=user, defaults=_actual_stats(user.pk)
+        )
+        return stats
+
+
+def recount(user_ids=None, post_ids=None):
+    """Пересчитывает счётчики всех пользователей и постов или только
+    ``user_ids`` и ``post_ids``; возвращает число исправленных строк."""
+    fixed = 0
+    users, posts = user_stats_values(), Post.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    with transaction.atomic():
+        for user in users.select_related('stats'):
+            actual = {
+                'posts_count': user.actual_posts,
+                'followers_count': user.actual_followers,
+                'following_count': user.actual_following,
+            }
+            try:
+                stats = user.stats
+            except UserStats.DoesNotExist:
+                UserStats.objects.create(user=user, **actual)
+                fixed += 1
+                continue
+            if any(getattr(stats, key) != value
+                   for key, value in actual.items()):
+                UserStats.objects.filter(pk=stats.pk).update(**actual)
+                fixed += 1
+        actual_comments = _count(Comment.objects, 'post')
+        fixed += posts.annotate(
+            actual=actual_comments
+        ).exclude(comments_count=F('actual')).count()
+        posts.update(comments_count=actual_comments)
+    return fixed
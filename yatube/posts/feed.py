@@ -0,0 +1,147 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается в ``FeedEntry`` всех подписчиков автора
+(fan-out on write), поэтому лента читается одним диапазоном по индексу
+``(user, -pub_date)``. Для авторов с числом подписчиков больше
+``FEED_FANOUT_LIMIT`` раскладка при записи не делается: их посты
+подтягиваются в ленту читателя при открытии (fan-out on read).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import FeedEntry, Follow, Post, UserStats
+
+PULLED_KEY = 'feed_pulled:{}'
+
+
+def is_prolific(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def _add_entries(user_ids, posts):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+            for user_id in user_ids
+            for post in posts
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if is_prolific(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _add_entries(followers, [post])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).only('pub_date')
+    _add_entries([user_id], posts[:settings.FEED_BACKFILL])
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def fill(user_id=None, author_ids=None, include_prolific=False):
+    """Добавляет в ленты недостающие записи: последние посты каждого
+    автора, на которого подписан читатель, кроме популярных. Нужна
+    после массовой вставки, минующей сигналы; ``user_id`` и
+    ``author_ids`` ограничивают её одним читателем и его авторами.
+    С ``include_prolific`` это ``backfill`` сразу для многих авторов."""
+    conditions, params = [], []
+    if not include_prolific:
+        conditions.append('COALESCE(s.followers_count, 0) <= %s')
+        params.append(settings.FEED_FANOUT_LIMIT)
+    if user_id is not None:
+        conditions.append('f.user_id = %s')
+        params.append(user_id)
+    if author_ids is not None:
+        if not author_ids:
+            return
+        conditions.append(
+            'f.author_id IN ({})'.format(', '.join(['%s'] * len(author_ids)))
+        )
+        params.extend(author_ids)
+    where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {FeedEntry._meta.db_table} (user_id, post_id, pub_date)
+            SELECT user_id, post_id, pub_date FROM (
+                SELECT f.user_id, p.id AS post_id, p.pub_date,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY f.id ORDER BY p.pub_date DESC
+                    ) AS position
+                FROM {Follow._meta.db_table} f
+                JOIN {Post._meta.db_table} p ON p.author_id = f.author_id
+                LEFT JOIN {UserStats._meta.db_table} s
+                    ON s.user_id = f.author_id
+                {where}
+            ) AS ranked
+            WHERE position <= %s
+            ON CONFLICT DO NOTHING
+            ''',
+            [*params, settings.FEED_BACKFILL],
+        )
+
+
+def pull_prolific(user_id):
+    """Подтягивает в ленту свежие посты популярных авторов."""
+    authors = list(Follow.objects.filter(
+        user_id=user_id,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    if not authors:
+        return
+    key = PULLED_KEY.format(user_id)
+    since = cache.get(key)
+    posts = Post.objects.filter(author_id__in=authors).only('pub_date')
+    if since is None:
+        posts = posts[:settings.FEED_BACKFILL * len(authors)]
+    else:
+        posts = posts.filter(pub_date__gt=since)
+    posts = list(posts)
+    _add_entries([user_id], posts)
+    if posts:
+        cache.set(key, max(post.pub_date for post in posts), None)
+
+
+def timeline(user):
+    """Лента пользователя: записи ``FeedEntry`` вместе с постами."""
+    pull_prolific(user.pk)
+    return FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    ).only(
+        'pub_date',
+        'post__text',
+        'post__pub_date',
+        'post__image',
+        'post__author__username',
+        'post__author__first_name',
+        'post__author__last_name',
+        'post__group__title',
+        'post__group__slug',
+        'post__comments_count',
+        'post__thumbnail',
+        'post__thumbnail_width',
+        'post__thumbnail_height',
+    ).prefetch_related('post__image_variants')
+
+
+def posts_of(entries):
+    return [entry.post for entry in entries]
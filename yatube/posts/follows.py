@@ -0,0 +1,110 @@
+"""Подписки без проверки перед записью.
+
+Подписка — один ``INSERT ... ON CONFLICT DO NOTHING``, отписка — один
+``DELETE``. По числу затронутых строк видно, изменилось ли состояние,
+и только тогда в той же транзакции обновляются счётчики, лента и
+поколения кеша. Поколения увеличиваются только после фиксации
+транзакции: иначе после отката кеш сбрасывался бы зря, а другой
+запрос успевал бы закешировать ещё старые данные под новым
+поколением. Одновременные клики разрешает ограничение
+``unique follow``, а не ``exists()`` перед записью.
+
+Подписки, созданные и удалённые через ORM, обрабатывают сигналы
+теми же функциями ``followed`` и ``unfollowed``.
+"""
+from collections import namedtuple
+
+from core.cache import bump_generation
+from django.db import connection, transaction
+
+from . import counters, feed
+from .models import Follow
+
+FollowState = namedtuple('FollowState', ('following', 'changed'))
+
+FOLLOW_TABLE = Follow._meta.db_table
+
+
+def scopes(*users):
+    return {f'author:{user.username}' for user in users}
+
+
+def bump_on_commit(changed_scopes):
+    transaction.on_commit(lambda: bump_generation(*changed_scopes))
+
+
+def followed(user_id, author_id, changed_scopes):
+    counters.change_user_stats(author_id, followers_count=1)
+    counters.change_user_stats(user_id, following_count=1)
+    feed.backfill(user_id, author_id)
+    bump_on_commit(changed_scopes)
+
+
+def unfollowed(user_id, author_id, changed_scopes):
+    counters.change_user_stats(author_id, followers_count=-1)
+    counters.change_user_stats(user_id, following_count=-1)
+    feed.trim(user_id, author_id)
+    bump_on_commit(changed_scopes)
+
+
+def follow(user, author):
+    """Подписывает ``user`` на ``author``; на себя подписаться нельзя."""
+    if user.pk == author.pk:
+        return FollowState(False, False)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FOLLOW_TABLE} (user_id, author_id) '
+                f'VALUES (%s, %s) ON CONFLICT DO NOTHING',
+                [user.pk, author.pk],
+            )
+            changed = cursor.rowcount == 1
+        if changed:
+            followed(user.pk, author.pk, scopes(user, author))
+    return FollowState(True, changed)
+
+
+def unfollow(user, author):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FOLLOW_TABLE} '
+                f'WHERE user_id = %s AND author_id = %s',
+                [user.pk, author.pk],
+            )
+            changed = cursor.rowcount == 1
+        if changed:
+            unfollowed(user.pk, author.pk, scopes(user, author))
+    return FollowState(False, changed)
+
+
+def follow_many(user, authors):
+    """Подписывает на всех ``authors`` одним запросом.
+
+    Возвращает ``{username: FollowState}``. ``RETURNING`` требует
+    SQLite 3.35 или PostgreSQL.
+    """
+    authors = {author.pk: author for author in authors if author != user}
+    if not authors:
+        return {}
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FOLLOW_TABLE} (user_id, author_id) VALUES '
+                + ', '.join(['(%s, %s)'] * len(authors))
+                + ' ON CONFLICT DO NOTHING RETURNING author_id',
+                [value for pk in authors for value in (user.pk, pk)],
+            )
+            created = {row[0] for row in cursor.fetchall()}
+        if created:
+            counters.change_many_user_stats(created, followers_count=1)
+            counters.change_user_stats(
+                user.pk, following_count=len(created)
+            )
+            # Как и при одиночной подписке, включая популярных авторов.
+            feed.fill(user.pk, sorted(created), include_prolific=True)
+            bump_on_commit(scopes(user, *(authors[pk] for pk in created)))
+    return {
+        author.username: FollowState(True, pk in created)
+        for pk, author in authors.items()
+    }
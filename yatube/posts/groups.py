@@ -0,0 +1,161 @@
+"""Страницы групп: группы по ``slug`` из памяти процесса и общий для
+всех посетителей кеш первой страницы.
+
+Карта ``slug → Group`` живёт в памяти каждого процесса. Её сбрасывает смена
+поколения области ``groups``, которое увеличивает сигнал сохранения или
+удаления группы, так что изменение видят все процессы.
+
+Первая страница группы — id её постов и признак следующей страницы —
+хранится в кеше под ключом с поколением области ``group:<slug>``,
+карточки постов — в кеше фрагментов ``post_cards``. В отличие от кеша
+целой страницы, который различает посетителей по cookie, эта запись
+общая. Новый пост в группе ставит задачу ``warm_group_page``, если
+такая задача для группы ещё не ждёт в очереди: она собирает страницу
+и карточки заранее, и первый посетитель после публикации их не строит.
+
+Попадания считаются по группам в памяти процесса и раз в
+``GROUP_STATS_FLUSH_INTERVAL`` секунд прибавляются к счётчикам в общем
+кеше, так что ``stats`` показывает сумму по всем процессам (без
+последних секунд других процессов). Инкремент на каждый запрос
+нагружал бы общий кеш и журнал инвалидаций ``TwoTierCache``.
+"""
+import threading
+import time
+from collections import Counter
+
+from core.cache import get_generations
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.template import Engine
+
+from .models import Group, Post
+from .scopes import GROUPS_SCOPE
+from .templatetags.post_cards import CARD_TEMPLATE, card_options, render_cards
+from .utils import feed_paginator
+
+FIRST_PAGE_KEY = 'group_first_page:{slug}:{generation}'
+STATS_KEY = 'group_first_page_stats:{slug}:{event}'
+EVENTS = ('hits', 'misses')
+
+_lock = threading.Lock()
+_groups = {'generation': None, 'by_slug': {}}
+_pending = {'flushed': time.monotonic(), 'counts': Counter()}
+
+
+def get_group(slug):
+    """Группа по ``slug`` без запроса к базе, если она уже в карте;
+    Http404, если группы нет."""
+    generation, = get_generations(GROUPS_SCOPE)
+    with _lock:
+        if _groups['generation'] != generation:
+            _groups['generation'] = generation
+            _groups['by_slug'] = {}
+        group = _groups['by_slug'].get(slug)
+    if group is None:
+        group = get_object_or_404(Group, slug=slug)
+        with _lock:
+            # Группу могли изменить, пока она читалась из базы.
+            if _groups['generation'] == generation:
+                _groups['by_slug'][slug] = group
+    return group
+
+
+def first_page_key(slug):
+    generation, = get_generations(f'group:{slug}')
+    return FIRST_PAGE_KEY.format(slug=slug, generation=generation)
+
+
+def build_first_page(group, key):
+    page = feed_paginator(group.posts.for_feed()).get_cursor_page()
+    cache.set(key, {
+        'ids': [post.pk for post in page.object_list],
+        'has_next': page.next_cursor is not None,
+    }, settings.CACHE_PAGE_TIMEOUT)
+    return page
+
+
+def first_page(group):
+    """Первая страница постов группы: из кеша — одним запросом постов
+    по первичному ключу, иначе из базы с записью в кеш."""
+    key = first_page_key(group.slug)
+    entry = cache.get(key)
+    record(group.slug, 'hits' if entry is not None else 'misses')
+    if entry is None:
+        return build_first_page(group, key)
+    posts = Post.objects.for_feed().in_bulk(entry['ids'])
+    return feed_paginator(group.posts.for_feed()).first_page_of(
+        [posts[pk] for pk in entry['ids'] if pk in posts],
+        entry['has_next'],
+    )
+
+
+def warm(slug):
+    """Собирает первую страницу группы и карточки её постов, если их
+    ещё нет в кеше для текущего поколения."""
+    group = Group.objects.filter(slug=slug).first()
+    key = first_page_key(slug)
+    if group is None or cache.get(key) is not None:
+        return
+    page = build_first_page(group, key)
+    render_cards(
+        page.object_list,
+        card_options('group_list'),
+        Engine.get_default().get_template(CARD_TEMPLATE),
+    )
+
+
+def record(slug, event):
+    with _lock:
+        _pending['counts'][slug, event] += 1
+        due = (
+            time.monotonic() - _pending['flushed']
+            >= settings.GROUP_STATS_FLUSH_INTERVAL
+        )
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Прибавляет накопленные в процессе попадания к общим счётчикам."""
+    with _lock:
+        counts = _pending['counts']
+        _pending['counts'] = Counter()
+        _pending['flushed'] = time.monotonic()
+    for (slug, event), count in counts.items():
+        key = STATS_KEY.format(slug=slug, event=event)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # Счётчик вытеснили между add и incr.
+            cache.set(key, count, None)
+
+
+def stats():
+    """Попадания в кеш первой страницы по группам, по всем процессам."""
+    flush_stats()
+    slugs = Group.objects.order_by('slug').values_list('slug', flat=True)
+    keys = {
+        (slug, event): STATS_KEY.format(slug=slug, event=event)
+        for slug in slugs for event in EVENTS
+    }
+    values = cache.get_many(keys.values())
+    snapshot = {}
+    for (slug, event), key in keys.items():
+        if key in values:
+            snapshot.setdefault(slug, dict.fromkeys(EVENTS, 0))
+            snapshot[slug][event] = values[key]
+    for entry in snapshot.values():
+        requests = entry['hits'] + entry['misses']
+        entry['hit_rate'] = (
+            round(entry['hits'] / requests, 3) if requests else None
+        )
+    return snapshot
+
+
+def reset():
+    with _lock:
+        _pending['counts'] = Counter()
+        _groups['generation'] = None
+        _groups['by_slug'] = {}
@@ -0,0 +1,52 @@
+"""Обработка картинок без обращения к Django.
+
+Функции модуля выполняются в отдельных процессах пула, поэтому
+не импортируют ни настройки, ни модели.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def supported_formats(formats):
+    """Форматы из ``formats``, которые умеет сохранять установленный PIL."""
+    Image.init()
+    return [name for name in formats if FORMATS[name][0] in Image.SAVE]
+
+
+def crop_to_ratio(image, ratio):
+    width, height = ratio
+    if image.width * height > image.height * width:
+        new_width = image.height * width // height
+        left = (image.width - new_width) // 2
+        return image.crop((left, 0, left + new_width, image.height))
+    new_height = image.width * height // width
+    top = (image.height - new_height) // 2
+    return image.crop((0, top, image.width, top + new_height))
+
+
+def render_variants(data, widths, formats, ratio):
+    """Строит варианты картинки ``data`` для каждой ширины и формата.
+
+    Ширины больше исходной пропускаются, кроме самой маленькой.
+    Возвращает список ``(width, height, format, bytes)``.
+    """
+    with Image.open(BytesIO(data)) as image:
+        image = crop_to_ratio(image.convert('RGB'), ratio)
+    variants = []
+    for index, width in enumerate(sorted(widths)):
+        if index and width > image.width:
+            break
+        height = max(1, round(width * ratio[1] / ratio[0]))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for name in formats:
+            buffer = BytesIO()
+            resized.save(buffer, FORMATS[name][0], quality=80)
+            variants.append((width, height, name, buffer.getvalue()))
+    return variants
@@ -0,0 +1,422 @@
+"""Отложенная запись комментариев (write-behind).
+
+При ``COMMENT_INGEST = 'buffered'`` проверенный комментарий не
+вставляется в базу на запросе, а дописывается строкой JSON в журнал
+процесса в ``COMMENT_BUFFER_DIR`` с ``fsync``, так что принятый
+комментарий переживает перезапуск. Команда ``manage.py flush_comments``
+забирает журналы и вставляет комментарии пачками по
+``COMMENT_FLUSH_BATCH``: одна транзакция и одна блокировка записи
+SQLite на пачку вместо одной на каждый комментарий.
+
+Журнал забирается переименованием. Писатель держит ``flock`` на время
+записи и, получив блокировку, проверяет, что файл не переименовали,
+поэтому строки не теряются. У записи есть ``ingest_id`` с уникальным
+индексом: если сбой случился между коммитом пачки и удалением журнала,
+повторная вставка пропускается.
+
+Пока комментарий ждёт вставки, автор видит его на странице поста:
+каждая ожидающая запись лежит в кеше под своим ключом с номером из
+счётчика автора и поста, так что одновременные комментарии не
+затирают друг друга. Страницу могут отдать другие процессы, поэтому
+отложенная запись включается только с общим кешем (``YATUBE_CACHE``
+``shared`` или ``two_tier``); с кешем в памяти процесса комментарии
+пишутся сразу. Задержку от приёма до вставки сброс копит в
+``stats.json`` рядом с журналами.
+"""
+import fcntl
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from core.cache import bump_generation
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import counters, tasks, threads
+from .models import Comment, Post
+from .scopes import post_scopes
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+COMMENT_TABLE = Comment._meta.db_table
+COLUMNS = [
+    Comment._meta.get_field(name)
+    for name in ('post', 'author', 'parent', 'text', 'created', 'path',
+                 'depth', 'ingest_id')
+]
+PENDING_COUNT_KEY = 'pending_comments:{}:{}'
+PENDING_KEY = 'pending_comments:{}:{}:{}'
+PROCESS_CACHES = (LocMemCache, DummyCache)
+STATS_FILE = 'stats.json'
+LAG_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300)
+SEGMENT_SUFFIX = '.log'
+CLAIMED_SUFFIX = '.flushing'
+
+
+def enabled():
+    return (
+        settings.COMMENT_INGEST == 'buffered'
+        and not isinstance(caches['default'], PROCESS_CACHES)
+    )
+
+
+def segment_path():
+    name = f'{socket.gethostname()}-{os.getpid()}{SEGMENT_SUFFIX}'
+    return os.path.join(settings.COMMENT_BUFFER_DIR, name)
+
+
+def same_file(fd, path):
+    try:
+        return os.stat(path).st_ino == os.fstat(fd).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def append(record):
+    """Дописывает запись в журнал процесса."""
+    os.makedirs(settings.COMMENT_BUFFER_DIR, exist_ok=True)
+    line = (json.dumps(record, ensure_ascii=False) + '\n').encode()
+    path = segment_path()
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Журнал мог быть забран, пока мы ждали блокировку.
+            if not same_file(fd, path):
+                continue
+            os.write(fd, line)
+            # fsync вне блокировки: одновременные писатели не ждут
+            # друг друга, а строка уже видна тому, кто заберёт журнал.
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            if settings.COMMENT_BUFFER_FSYNC:
+                os.fsync(fd)
+            return
+        finally:
+            os.close(fd)
+
+
+def submit(comment):
+    """Принимает проверенный несохранённый комментарий в журнал.
+
+    ``parent_id`` и префикс ``path`` уже заданы ``threads.reply_to``.
+    """
+    record = {
+        'id': uuid.uuid4().hex,
+        'post': comment.post_id,
+        'author': comment.author_id,
+        'parent': comment.parent_id,
+        'path': comment.path,
+        'text': comment.text,
+        'accepted': time.time(),
+    }
+    append(record)
+    remember_pending(record)
+    # Своя страница поста не должна отдаваться автору как 304.
+    bump_generation(f'post:{comment.post_id}')
+    return record
+
+
+def build(record):
+    return Comment(
+        post_id=record['post'],
+        author_id=record['author'],
+        parent_id=record['parent'],
+        text=record['text'],
+        created=datetime.fromtimestamp(record['accepted'], timezone.utc),
+        path=record['path'],
+        depth=record['path'].count(threads.SEPARATOR),
+        ingest_id=uuid.UUID(record['id']),
+    )
+
+
+def remember_pending(record):
+    """Кладёт запись в кеш под новым номером: ``incr`` атомарен,
+    поэтому параллельные записи одного автора получают разные ключи."""
+    timeout = settings.COMMENT_PENDING_TIMEOUT
+    count_key = PENDING_COUNT_KEY.format(record['author'], record['post'])
+    cache.add(count_key, 0, timeout)
+    try:
+        number = cache.incr(count_key)
+    except ValueError:
+        # Счётчик истёк между add и incr.
+        cache.set(count_key, 1, timeout)
+        number = 1
+    cache.touch(count_key, timeout)
+    cache.set(
+        PENDING_KEY.format(record['author'], record['post'], number),
+        record,
+        timeout,
+    )
+
+
+def pending_records(author_id, post_id):
+    """Ожидающие записи автора к посту: ``{ключ кеша: запись}``."""
+    count = cache.get(PENDING_COUNT_KEY.format(author_id, post_id), 0)
+    return cache.get_many([
+        PENDING_KEY.format(author_id, post_id, number)
+        for number in range(1, count + 1)
+    ])
+
+
+def pending_for(user, post):
+    """Ещё не вставленные комментарии ``user`` к посту."""
+    if not enabled() or not user.is_authenticated:
+        return []
+    pending = pending_records(user.pk, post.pk)
+    if not pending:
+        return []
+    flushed = {
+        ingest_id.hex for ingest_id in Comment.objects.filter(
+            ingest_id__in=[record['id'] for record in pending.values()]
+        ).values_list('ingest_id', flat=True)
+    }
+    if flushed:
+        cache.delete_many([
+            key for key, record in pending.items()
+            if record['id'] in flushed
+        ])
+    comments = [
+        build(record) for record in pending.values()
+        if record['id'] not in flushed
+    ]
+    for comment in comments:
+        comment.author = user
+    return comments
+
+
+@contextmanager
+def flush_lock():
+    """Одновременно журналы забирает только один процесс."""
+    os.makedirs(settings.COMMENT_BUFFER_DIR, exist_ok=True)
+    path = os.path.join(settings.COMMENT_BUFFER_DIR, 'flush.lock')
+    with open(path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def claim_segments():
+    """Забирает журналы писателей; незавершённые прошлые сбросы
+    тоже возвращаются."""
+    directory = settings.COMMENT_BUFFER_DIR
+    for name in os.listdir(directory):
+        if name.endswith(SEGMENT_SUFFIX):
+            claimed = f'{name}.{time.time_ns()}{CLAIMED_SUFFIX}'
+            try:
+                os.rename(
+                    os.path.join(directory, name),
+                    os.path.join(directory, claimed),
+                )
+            except FileNotFoundError:
+                continue
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith(CLAIMED_SUFFIX)
+    )
+
+
+def read_segment(path):
+    records = []
+    with open(path, 'rb') as stream:
+        # Дожидаемся писателя, который начал запись до переименования.
+        fcntl.flock(stream, fcntl.LOCK_EX)
+        for number, line in enumerate(stream, 1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning('Повреждённая строка %s в %s', number, path)
+    return records
+
+
+def existing(model, ids):
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def insert(comments):
+    """Вставляет пачку одним ``INSERT ... RETURNING``; возвращает
+    вставленные комментарии с ``pk``. ``RETURNING`` требует SQLite 3.35
+    или PostgreSQL."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE} '
+            f'({", ".join(field.column for field in COLUMNS)}, '
+            f'replies_count) VALUES '
+            + ', '.join(
+                [f'({", ".join(["%s"] * len(COLUMNS))}, 0)'] * len(comments)
+            )
+            + ' ON CONFLICT DO NOTHING RETURNING id, ingest_id',
+            [
+                field.get_db_prep_save(
+                    getattr(comment, field.attname), connection
+                )
+                for comment in comments for field in COLUMNS
+            ],
+        )
+        ids = {
+            Comment._meta.get_field('ingest_id').to_python(ingest_id): pk
+            for pk, ingest_id in cursor.fetchall()
+        }
+    inserted = []
+    for comment in comments:
+        if comment.ingest_id in ids:
+            comment.pk = ids[comment.ingest_id]
+            inserted.append(comment)
+    return inserted
+
+
+def after_insert(comments, posts):
+    """То, что для одиночного комментария делают сигналы."""
+    Comment.objects.filter(pk__in=[comment.pk for comment in comments]).update(
+        path=Concat(F('path'), threads.segment_expression())
+    )
+    replies = Counter(
+        ancestor for comment in comments
+        for ancestor in threads.ancestor_ids(comment.path)
+    )
+    by_delta = defaultdict(list)
+    for ancestor, delta in replies.items():
+        by_delta[delta].append(ancestor)
+    for delta, ancestors in by_delta.items():
+        Comment.objects.filter(pk__in=ancestors).update(
+            replies_count=F('replies_count') + delta
+        )
+    posts_counts = Counter(comment.post_id for comment in comments)
+    for post_id, count in posts_counts.items():
+        counters.change_comments_count(post_id, count)
+    for comment in comments:
+        author_id, email = posts[comment.post_id]
+        if email and author_id != comment.author_id:
+            tasks.notify_comment.delay(comment.pk)
+
+
+def insert_batch(records):
+    """Вставляет пачку записей в одной транзакции; записи об удалённых
+    постах, авторах и родителях пропускаются. Возвращает вставленные."""
+    comments = [build(record) for record in records]
+    posts = {
+        pk: (author_id, email) for pk, author_id, email in
+        Post.objects.filter(
+            pk__in={comment.post_id for comment in comments}
+        ).values_list('pk', 'author_id', 'author__email')
+    }
+    authors = existing(User, {comment.author_id for comment in comments})
+    parents = existing(
+        Comment, {comment.parent_id for comment in comments} - {None}
+    )
+    comments = [
+        comment for comment in comments
+        if comment.post_id in posts and comment.author_id in authors
+        and comment.parent_id in parents | {None}
+    ]
+    if not comments:
+        return []
+    with transaction.atomic():
+        inserted = insert(comments)
+        if inserted:
+            after_insert(inserted, posts)
+    scopes = set()
+    for post_id in {comment.post_id for comment in inserted}:
+        scopes |= post_scopes(post_id)
+    bump_generation(*scopes)
+    return inserted
+
+
+def flush():
+    """Вставляет все принятые комментарии; возвращает число
+    вставленных."""
+    flushed = 0
+    with flush_lock():
+        for path in claim_segments():
+            records = read_segment(path)
+            batch = settings.COMMENT_FLUSH_BATCH
+            for start in range(0, len(records), batch):
+                chunk = records[start:start + batch]
+                flushed += len(insert_batch(chunk))
+                record_lags(time.time() - record['accepted']
+                            for record in chunk)
+            os.remove(path)
+    return flushed
+
+
+def empty_stats():
+    return {
+        'flushed': 0,
+        'lag_s': dict.fromkeys([*map(str, LAG_BUCKETS), '+Inf'], 0),
+        'max_lag_s': 0.0,
+        'last_lag_s': 0.0,
+        'total_lag_s': 0.0,
+    }
+
+
+def stats_path():
+    return os.path.join(settings.COMMENT_BUFFER_DIR, STATS_FILE)
+
+
+def load_stats():
+    try:
+        with open(stats_path(), encoding='utf-8') as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return empty_stats()
+
+
+def record_lags(lags):
+    """Копит задержку «принят — вставлен»; вызывается под
+    ``flush_lock``."""
+    stats = load_stats()
+    for lag in lags:
+        bucket = next(
+            (str(bound) for bound in LAG_BUCKETS if lag <= bound), '+Inf'
+        )
+        stats['lag_s'][bucket] += 1
+        stats['flushed'] += 1
+        stats['total_lag_s'] += lag
+        stats['max_lag_s'] = max(stats['max_lag_s'], lag)
+        stats['last_lag_s'] = lag
+    temporary = stats_path() + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as stream:
+        json.dump(stats, stream)
+    os.replace(temporary, stats_path())
+
+
+def first_accepted(path):
+    try:
+        with open(path, 'rb') as stream:
+            return json.loads(stream.readline())['accepted']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def stats():
+    """Статистика сброса и объём ещё не вставленных журналов."""
+    data = load_stats()
+    data['backlog_bytes'] = 0
+    data['oldest_backlog_s'] = 0.0
+    directory = settings.COMMENT_BUFFER_DIR
+    if not os.path.isdir(directory):
+        return data
+    now = time.time()
+    for entry in os.scandir(directory):
+        if not entry.name.endswith((SEGMENT_SUFFIX, CLAIMED_SUFFIX)):
+            continue
+        data['backlog_bytes'] += entry.stat().st_size
+        accepted = first_accepted(entry.path)
+        if accepted is not None:
+            data['oldest_backlog_s'] = max(
+                data['oldest_backlog_s'], now - accepted
+            )
+    return data
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts import variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит адаптивные варианты для уже загруженных картинок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить варианты и там, где они уже есть',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Сколько картинок кодировать параллельно',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        if not options['force']:
+            posts = posts.filter(image_variants__isnull=True)
+        ids = list(posts.values_list('pk', flat=True))
+        size = options['batch_size']
+        created = 0
+        for start in range(0, len(ids), size):
+            batch = Post.objects.filter(pk__in=ids[start:start + size])
+            created += variants.build_many(batch)
+            done = min(start + size, len(ids))
+            self.stdout.write(f'Обработано постов: {done}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Создано вариантов: {created}')
+        )
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TYPES, export_records, write_records
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии и подписки в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help='Файл для записи, по умолчанию stdout',
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--types', nargs='+', choices=TYPES, default=TYPES,
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        format = options['format'] or (
+            'csv' if output.endswith('.csv') else 'jsonl'
+        )
+        records = export_records(options['types'], options['chunk_size'])
+        start = time.perf_counter()
+        if output == '-':
+            count = write_records(records, sys.stdout, format)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = write_records(records, stream, format)
+        elapsed = time.perf_counter() - start
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено записей: {count} '
+            f'({count / elapsed if elapsed else 0:.0f} строк/с)'
+        ))
@@ -0,0 +1,43 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import ingest
+
+
+class Command(BaseCommand):
+    help = 'Вставляет принятые в журнал комментарии пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, пока не придёт SIGTERM',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Пауза между сбросами, секунд',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.COMMENT_FLUSH_INTERVAL
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        total = 0
+        while True:
+            close_old_connections()
+            total += ingest.flush()
+            if not options['loop'] or self.stopping:
+                break
+            time.sleep(interval)
+        stats = ingest.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Вставлено комментариев: {total}, '
+            f'максимальная задержка: {stats["max_lag_s"]:.2f} с'
+        ))
+
+    def stop(self, *args):
+        self.stopping = True
@@ -0,0 +1,64 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import FORMATS, import_records, read_records, refresh
+
+
+class Command(BaseCommand):
+    help = 'Загружает посты, комментарии и подписки из JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='Файл с записями, по умолчанию stdin',
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число процессов для вставки пачек',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы',
+        )
+        parser.add_argument(
+            '--no-refresh', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        source = options['input']
+        format = options['format'] or (
+            'csv' if source.endswith('.csv') else 'jsonl'
+        )
+        stream = (
+            sys.stdin if source == '-'
+            else open(source, encoding='utf-8', newline='')
+        )
+        start = time.perf_counter()
+        try:
+            result = import_records(
+                read_records(stream, format),
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                create_missing=options['create_missing'],
+            )
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Некорректные данные: {error}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.perf_counter() - start
+        total = sum(result.imported.values())
+        if not options['no_refresh']:
+            refresh(result.changes)
+        self.stdout.write(', '.join(
+            f'{kind}: {count}' for kind, count in result.imported.items()
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {total}, пропущено: {result.errors} '
+            f'({total / elapsed if elapsed else 0:.0f} строк/с)'
+        ))
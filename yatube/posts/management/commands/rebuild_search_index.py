@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {total}')
+        )
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Значение FEED_BACKFILL на момент миграции.
+FEED_BACKFILL = 100
+
+
+def fill_feed(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    for follow in Follow.objects.iterator():
+        posts = Post.objects.filter(
+            author_id=follow.author_id
+        ).order_by('-pub_date')[:FEED_BACKFILL]
+        FeedEntry.objects.bulk_create(
+            FeedEntry(
+                user_id=follow.user_id, post_id=post.pk, pub_date=post.pub_date
+            )
+            for post in posts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0007_test_tuple'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'feed entry',
+                'verbose_name_plural': 'feed entries',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique feed entry'),
+        ),
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    for post in Post.objects.annotate(total=models.Count('comments')):
+        if post.total:
+            Post.objects.filter(pk=post.pk).update(comments_count=post.total)
+    UserStats.objects.bulk_create(
+        UserStats(
+            user_id=user.pk,
+            posts_count=Post.objects.filter(author_id=user.pk).count(),
+            followers_count=Follow.objects.filter(author_id=user.pk).count(),
+            following_count=Follow.objects.filter(user_id=user.pk).count(),
+        )
+        for user in User.objects.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_add_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.IntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Число подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'user stats',
+                'verbose_name_plural': 'user stats',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
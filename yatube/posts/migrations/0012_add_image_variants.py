@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_add_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='posts/variants/', verbose_name='Картинка')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_variants', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'image variant',
+                'verbose_name_plural': 'image variants',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postimagevariant',
+            constraint=models.UniqueConstraint(fields=('post', 'format', 'width'), name='unique image variant'),
+        ),
+    ]
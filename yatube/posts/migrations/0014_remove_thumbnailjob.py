@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:25
+
+import json
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def move_to_queue(apps, schema_editor):
+    """Невыполненные задания превью переходят в общую очередь."""
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    Job = apps.get_model('core', 'Job')
+    post_ids = ThumbnailJob.objects.exclude(
+        status='done'
+    ).values_list('post_id', flat=True).distinct()
+    now = timezone.now()
+    Job.objects.bulk_create([
+        Job(
+            task='posts.tasks.build_thumbnail',
+            payload=json.dumps({'args': [post_id], 'kwargs': {}}),
+            priority=5,
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+            run_after=now,
+        )
+        for post_id in post_ids
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0013_add_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_queue, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='ThumbnailJob',
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:39
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, LPad
+import django.db.models.deletion
+
+
+def fill_paths(apps, schema_editor):
+    """Все существующие комментарии — корни своих веток."""
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.update(
+        path=LPad(Cast('pk', models.CharField()), 10, models.Value('0'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_remove_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='posts.Comment', verbose_name='Ответ на комментарий'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число ответов в ветке'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='ingest_id',
+            field=models.UUIDField(editable=False, null=True, unique=True, verbose_name='Идентификатор отложенной записи'),
+        ),
+    ]
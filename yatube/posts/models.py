@@ -2,6 +2,8 @@ from core.models import CreatedModel
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .imaging import FORMATS
+
 User = get_user_model()
 
 
@@ -18,6 +20,26 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом,
+        лишние колонки не загружаются."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'image',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__title',
+            'group__slug',
+            'comments_count',
+            'thumbnail',
+            'thumbnail_width',
+            'thumbnail_height',
+        ).prefetch_related('image_variants')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -47,15 +69,113 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    thumbnail = models.ImageField(
+        verbose_name='Превью картинки',
+        upload_to='posts/thumbs/',
+        blank=True,
+        editable=False,
+    )
+    thumbnail_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    thumbnail_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.IntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'post'
         verbose_name_plural = 'posts'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    def image_sources(self):
+        """Наборы srcset по форматам для тега <picture>."""
+        sources = {}
+        variants = sorted(
+            self.image_variants.all(), key=lambda variant: variant.width
+        )
+        for variant in variants:
+            sources.setdefault(variant.format, []).append(
+                f'{variant.image.url} {variant.width}w'
+            )
+        return [
+            {'type': FORMATS[name][1], 'srcset': ', '.join(sources[name])}
+            for name in FORMATS if name in sources
+        ]
+
+
+class PostImageVariant(models.Model):
+    """Вариант картинки поста заданной ширины и формата."""
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+    )
+    image = models.ImageField(
+        verbose_name='Картинка',
+        upload_to='posts/variants/',
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+    format = models.CharField(verbose_name='Формат', max_length=10)
+
+    class Meta:
+        verbose_name = 'image variant'
+        verbose_name_plural = 'image variants'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('post', 'format', 'width'),
+                name='unique image variant'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post_id}: {self.width}w {self.format}'
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_thread(self):
+        """Комментарии для страницы поста: автор тем же запросом,
+        только выводимые колонки."""
+        return self.select_related('author').only(
+            'text',
+            'created',
+            'post_id',
+            'parent_id',
+            'path',
+            'depth',
+            'replies_count',
+            'author__username',
+        )
+
 
 class Comment(CreatedModel, models.Model):
     post = models.ForeignKey(
@@ -73,11 +193,57 @@ class Comment(CreatedModel, models.Model):
     text = models.TextField(
         verbose_name='Текст комментария',
     )
+    parent = models.ForeignKey(
+        'self',
+        verbose_name='Ответ на комментарий',
+        on_delete=models.CASCADE,
+        related_name='children',
+        blank=True,
+        null=True,
+    )
+    path = models.CharField(
+        verbose_name='Путь в ветке',
+        max_length=255,
+        editable=False,
+        default='',
+    )
+    depth = models.PositiveSmallIntegerField(
+        verbose_name='Глубина',
+        editable=False,
+        default=0,
+    )
+    replies_count = models.PositiveIntegerField(
+        verbose_name='Число ответов в ветке',
+        editable=False,
+        default=0,
+    )
+    ingest_id = models.UUIDField(
+        verbose_name='Идентификатор отложенной записи',
+        editable=False,
+        unique=True,
+        null=True,
+    )
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ('created',)
         verbose_name = 'comment'
         verbose_name_plural = 'comments'
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx',
+            ),
+            models.Index(
+                fields=('post', 'path'),
+                name='comment_post_path_idx',
+            ),
+            models.Index(
+                fields=('-created', '-id'),
+                name='comment_created_id_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -106,3 +272,96 @@ class Follow(models.Model):
                 name='unique follow'
             ),
         )
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'feed entry'
+        verbose_name_plural = 'feed entries'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique feed entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-id'),
+                name='feed_user_pub_date_id_idx',
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые поддерживаются сигналами."""
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField(
+        verbose_name='Число постов',
+        default=0,
+    )
+    followers_count = models.IntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+    )
+    following_count = models.IntegerField(
+        verbose_name='Число подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'user stats'
+        verbose_name_plural = 'user stats'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class SearchTerm(models.Model):
+    """Запись обратного индекса: основа слова и число её вхождений
+    в текст поста. Используется, когда FTS5 недоступен."""
+    term = models.CharField(
+        verbose_name='Основа слова',
+        max_length=64,
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+    count = models.PositiveIntegerField(
+        verbose_name='Число вхождений',
+    )
+
+    class Meta:
+        verbose_name = 'search term'
+        verbose_name_plural = 'search terms'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'),
+                name='unique search term'
+            ),
+        )
@@ -0,0 +1,55 @@
+"""Области кеша (``core.cache``), в которых видны данные постов."""
+from django.contrib.auth import get_user_model
+
+from .models import Post
+
+User = get_user_model()
+
+# Увеличивается при любом изменении групп: slug и название группы
+# выводятся на карточках и страницах постов.
+GROUPS_SCOPE = 'groups'
+# Поля пользователя, которые выводятся на карточках и страницах постов.
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def post_scopes(post_id):
+    """Области кеша, в которых виден пост."""
+    scopes = {'posts', f'post:{post_id}'}
+    rows = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    )
+    for username, slug in rows:
+        scopes.add(f'author:{username}')
+        if slug:
+            scopes.add(f'group:{slug}')
+    return scopes
+
+
+def card_scopes(post):
+    """Области, от которых зависит карточка поста: сам пост, запись
+    его автора и, если пост в группе, группы."""
+    scopes = [f'post:{post.pk}', f'user:{post.author_id}']
+    if post.group_id:
+        scopes.append(GROUPS_SCOPE)
+    return scopes
+
+
+def user_scopes(user_id, *usernames):
+    """Области, где видны имя и ``username`` пользователя: его
+    карточки, профиль и страницы с его постами."""
+    scopes = {'posts', f'user:{user_id}'}
+    scopes.update(f'author:{username}' for username in usernames)
+    slugs = Post.objects.filter(
+        author_id=user_id, group__isnull=False
+    ).values_list('group__slug', flat=True).distinct()
+    scopes.update(f'group:{slug}' for slug in slugs)
+    return scopes
+
+
+def author_scopes(*user_ids):
+    return {
+        f'author:{username}'
+        for username in User.objects.filter(
+            pk__in=user_ids
+        ).values_list('username', flat=True)
+    }
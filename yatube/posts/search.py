@@ -0,0 +1,155 @@
+"""Полнотекстовый поиск по постам.
+
+Текст поста разбивается на основы слов (``posts.stemmer``), которые
+индексируются в виртуальной таблице SQLite FTS5 ``posts_post_fts``
+и ранжируются по BM25. Если FTS5 недоступен (другая СУБД или SQLite
+без расширения) или ``SEARCH_BACKEND = 'inverted'``, используется
+обратный индекс в модели ``SearchTerm`` с ранжированием по TF-IDF.
+Индекс обновляется сигналами сохранения и удаления поста; ведётся
+только выбранный индекс, поэтому после смены ``SEARCH_BACKEND`` нужно
+выполнить ``manage.py rebuild_search_index``.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+
+from .models import Post, SearchTerm
+from .stemmer import stems
+
+FTS_TABLE = 'posts_post_fts'
+TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+_fts_tables = {}
+
+
+def fts_table_exists():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_tables[name]
+
+
+def use_fts():
+    return settings.SEARCH_BACKEND == 'fts5' and fts_table_exists()
+
+
+def index_terms(text):
+    return [term[:TERM_LENGTH] for term in stems(text)]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(index_terms(query)))
+
+
+def index_post(post_id, text):
+    terms = index_terms(text)
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)',
+                [post_id, ' '.join(terms)],
+            )
+        return
+    with transaction.atomic():
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(post_id=post_id, term=term, count=count)
+            for term, count in Counter(terms).items()
+        )
+
+
+def remove_post(post_id):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+    # Записи SearchTerm удаляются каскадно вместе с постом.
+
+
+def rebuild(batch_size=500, posts=None):
+    """Переиндексирует все посты или только ``posts`` (queryset);
+    возвращает их число."""
+    if posts is None:
+        # Второй индекс тоже очищается: сигналы его не ведут, и
+        # устаревшие записи не должны дожить до следующей смены
+        # SEARCH_BACKEND.
+        SearchTerm.objects.all().delete()
+        if fts_table_exists():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        posts = Post.objects.all()
+    total = 0
+    posts = posts.values_list('pk', 'text').order_by('pk')
+    for post_id, text in posts.iterator(chunk_size=batch_size):
+        index_post(post_id, text)
+        total += 1
+    return total
+
+
+def _fts_search(terms, limit):
+    match = ' '.join(
+        '"{}"'.format(term.replace('"', '""')) for term in terms
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            'ORDER BY rank, rowid DESC LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _inverted_search(terms, limit):
+    matches = SearchTerm.objects.filter(term__in=terms)
+    frequencies = dict(
+        matches.values_list('term').annotate(posts=Count('post'))
+    )
+    if len(frequencies) < len(terms):
+        return []
+    total = Post.objects.count()
+    score = Sum(Case(
+        *(
+            When(term=term, then=F('count') * math.log(1 + total / posts))
+            for term, posts in frequencies.items()
+        ),
+        output_field=FloatField(),
+    ))
+    return list(
+        matches.values('post')
+        .annotate(matched=Count('term'), score=score)
+        .filter(matched=len(terms))
+        .order_by('-score', '-post')
+        .values_list('post', flat=True)[:limit]
+    )
+
+
+def search_ids(query, limit=None):
+    """Id постов, содержащих все слова запроса, от более релевантных
+    к менее."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    if use_fts():
+        return _fts_search(terms, limit)
+    return _inverted_search(terms, limit)
+
+
+def search_page(query, number):
+    """Страница результатов: посты в порядке релевантности."""
+    page = Paginator(search_ids(query), settings.LIMIT_POSTS).get_page(number)
+    posts = Post.objects.for_feed().in_bulk(page.object_list)
+    page.object_list = [posts[pk] for pk in page.object_list if pk in posts]
+    return page
@@ -0,0 +1,122 @@
+from core.cache import bump_generation
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed, follows, groups, search, tasks, threads
+from .models import Comment, Follow, Group, Post
+from .scopes import USER_CARD_FIELDS, author_scopes, post_scopes, user_scopes
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    # Пост мог сменить группу или исчезнуть: области, где он был
+    # виден до изменения, тоже нужно сбросить.
+    instance._previous_scopes = (
+        post_scopes(instance.pk) if instance.pk else set()
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, update_fields, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+        feed.fan_out(instance)
+        if instance.group_id:
+            # Пачка постов в группе прогревает её страницу один раз.
+            tasks.warm_group_page.delay_once(instance.group.slug)
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance.pk, instance.text)
+    bump_generation(*post_scopes(instance.pk) | instance._previous_scopes)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+    search.remove_post(instance.pk)
+    bump_generation(*instance._previous_scopes)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+        threads.attach(instance)
+    bump_generation(*post_scopes(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    threads.change_replies(instance.path, -1)
+    bump_generation(*post_scopes(instance.post_id))
+
+
+@receiver(pre_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    # У группы мог смениться slug: страница по старому адресу тоже
+    # должна сброситься.
+    instance._previous_scopes = {
+        f'group:{slug}' for slug in Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True)
+    } if instance.pk else set()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_generation(
+        'posts',
+        f'group:{instance.slug}',
+        groups.GROUPS_SCOPE,
+        *instance._previous_scopes,
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields, **kwargs):
+    # Вход пользователя сохраняет только last_login: лишний запрос
+    # здесь не нужен.
+    if not instance.pk or (
+        update_fields is not None
+        and not set(update_fields) & set(USER_CARD_FIELDS)
+    ):
+        instance._previous_names = None
+        return
+    instance._previous_names = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*USER_CARD_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_names', None)
+    current = tuple(getattr(instance, field) for field in USER_CARD_FIELDS)
+    if previous is None or previous == current:
+        return
+    bump_generation(*user_scopes(instance.pk, previous[0], current[0]))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        follows.followed(
+            instance.user_id,
+            instance.author_id,
+            author_scopes(instance.user_id, instance.author_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.unfollowed(
+        instance.user_id,
+        instance.author_id,
+        author_scopes(instance.user_id, instance.author_id),
+    )
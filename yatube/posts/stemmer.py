@@ -0,0 +1,125 @@
+"""Стеммер Snowball для русского языка и разбиение текста на слова."""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+
+def _endings(*groups):
+    """Окончания с флагом «должно идти после а/я», длинные первыми."""
+    endings = [
+        (ending, needs_a)
+        for needs_a, group in groups
+        for ending in group.split()
+    ]
+    return sorted(endings, key=lambda item: -len(item[0]))
+
+
+PERFECTIVE_GERUND = _endings(
+    (True, 'в вши вшись'),
+    (False, 'ив ивши ившись ыв ывши ывшись'),
+)
+ADJECTIVE = _endings((
+    False,
+    'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому '
+    'их ых ую юю ая яя ою ею',
+))
+PARTICIPLE = _endings(
+    (True, 'ем нн вш ющ щ'),
+    (False, 'ивш ывш ующ'),
+)
+REFLEXIVE = _endings((False, 'ся сь'))
+VERB = _endings(
+    (True, 'ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно'),
+    (
+        False,
+        'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло '
+        'ено ят ует уют ит ыт ены ить ыть ишь ую ю',
+    ),
+)
+NOUN = _endings((
+    False,
+    'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем '
+    'ам ом о у ах иях ях ы ь ию ью ю ия ья я',
+))
+SUPERLATIVE = _endings((False, 'ейш ейше'))
+DERIVATIONAL = _endings((False, 'ост ость'))
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """Снимает самое длинное окончание, целиком лежащее после ``start``."""
+    for ending, needs_a in endings:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if needs_a and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return None
+        return word[:cut]
+    return None
+
+
+def _strip_inflection(word, rv):
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    stripped = _strip(word, rv, REFLEXIVE)
+    if stripped is not None:
+        word = stripped
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped is not None:
+        participle = _strip(stripped, rv, PARTICIPLE)
+        return stripped if participle is None else participle
+    for endings in (VERB, NOUN):
+        stripped = _strip(word, rv, endings)
+        if stripped is not None:
+            return stripped
+    return word
+
+
+def _undouble(word, rv):
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    return word
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not re.search('[а-я]', word):
+        return word
+    rv, r2 = _regions(word)
+    word = _strip_inflection(word, rv)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    stripped = _strip(word, r2, DERIVATIONAL)
+    if stripped is not None:
+        word = stripped
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        return _undouble(stripped, rv)
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def stems(text):
+    """Основы всех слов текста в порядке появления."""
+    return [stem(word) for word in WORD_RE.findall(text)]
@@ -0,0 +1,79 @@
+"""Фоновые задачи постов: превью картинок, уведомления по почте и
+прогрев страниц групп."""
+from core.jobs import task
+from core.tasks import delivery_connection
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from . import groups, thumbnails, variants
+from .models import Comment, Post
+
+User = get_user_model()
+
+
+def schedule_thumbnail(post):
+    """Ставит в очередь построение превью картинки поста; если картинку
+    убрали, сразу удаляет превью и варианты."""
+    if post.image:
+        return build_thumbnail.delay(post.pk)
+    post.thumbnail = ''
+    post.thumbnail_width = post.thumbnail_height = None
+    post.save(update_fields=(
+        'thumbnail', 'thumbnail_width', 'thumbnail_height'
+    ))
+    variants.build(post)
+    return None
+
+
+@task(priority=5)
+def build_thumbnail(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    # Пост могли удалить или убрать у него картинку, пока задание ждало.
+    if post is not None and post.image:
+        thumbnails.process(post)
+
+
+def notify(user, subject, message):
+    # Задача уже выполняется воркером: письмо отправляется сразу,
+    # а не ставится в очередь ещё раз.
+    send_mail(
+        subject, message, None, [user.email],
+        connection=delivery_connection(),
+    )
+
+
+@task()
+def warm_group_page(slug):
+    groups.warm(slug)
+
+
+@task(priority=-5)
+def notify_comment(comment_id):
+    comment = Comment.objects.select_related(
+        'author', 'post__author'
+    ).filter(pk=comment_id).first()
+    if comment is None:
+        return
+    url = reverse('posts:post_detail', args=(comment.post_id,))
+    notify(
+        comment.post.author,
+        'Новый комментарий',
+        f'Комментарий от {comment.author.username} к вашему посту '
+        f'{settings.SITE_URL}{url}:\n\n{comment.text}',
+    )
+
+
+@task(priority=-5)
+def notify_follower(user_id, author_id):
+    users = User.objects.in_bulk((user_id, author_id))
+    if len(users) < 2:
+        return
+    follower = users[user_id]
+    url = reverse('posts:profile', args=(follower.username,))
+    notify(
+        users[author_id],
+        'Новый подписчик',
+        f'Новый подписчик {follower.username}: {settings.SITE_URL}{url}',
+    )
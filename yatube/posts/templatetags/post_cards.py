@@ -0,0 +1,90 @@
+"""Карточки постов в лентах с кешем отрендеренных фрагментов.
+
+Карточка не зависит от посетителя — только от поста и от того, на
+какой странице она выводится (на странице профиля автор не показан,
+ссылки на пост и группу есть только в общей ленте и профиле).
+Ключ фрагмента включает поколения областей ``scopes.card_scopes``:
+поста (его меняют сигналы поста, картинки и комментариев), записи
+автора (имя и ``username``) и групп (``slug`` в ссылке).
+Поколения и фрагменты всей страницы читаются двумя ``get_many``::
+
+    {% post_cards page_obj as cards %}
+    {% for card in cards %}{{ card }}{% endfor %}
+"""
+from core.cache import get_generations
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from ..scopes import card_scopes
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post.html'
+CARD_KEY = 'post_card:{variant}:{language}:{pk}:{generation}'
+
+
+def card_options(url_name):
+    return {
+        'show_author': url_name != 'profile',
+        'show_links': url_name in ('index', 'profile'),
+    }
+
+
+def request_options(request):
+    match = getattr(request, 'resolver_match', None)
+    return card_options(match.url_name if match else None)
+
+
+def card_keys(posts, options):
+    variant = '{show_author:d}{show_links:d}'.format(**options)
+    scopes = [card_scopes(post) for post in posts]
+    unique = list(dict.fromkeys(scope for group in scopes for scope in group))
+    generations = dict(zip(unique, get_generations(*unique)))
+    return [
+        CARD_KEY.format(
+            variant=variant,
+            language=get_language(),
+            pk=post.pk,
+            generation='.'.join(
+                str(generations[scope]) for scope in post_scopes
+            ),
+        )
+        for post, post_scopes in zip(posts, scopes)
+    ]
+
+
+def render_cards(posts, options, card):
+    """Карточки ``posts`` шаблоном ``card``: из кеша фрагментов или
+    отрендеренные заново (и тогда сохранённые в кеш)."""
+    if not settings.POST_CARD_CACHE:
+        return [
+            mark_safe(card.render(Context({'post': post, **options})))
+            for post in posts
+        ]
+    keys = card_keys(posts, options)
+    cards = cache.get_many(keys)
+    rendered = {
+        key: card.render(Context({'post': post, **options}))
+        for key, post in zip(keys, posts) if key not in cards
+    }
+    if rendered:
+        cache.set_many(rendered, settings.CACHE_PAGE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Отрендеренные карточки постов в том же порядке."""
+    posts = list(posts)
+    if not posts:
+        return []
+    return render_cards(
+        posts,
+        request_options(context.get('request')),
+        context.template.engine.get_template(CARD_TEMPLATE),
+    )
@@ -1,15 +1,28 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import StringIO
 
+from core import jobs
+from core.models import Job
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core import mail
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from posts.models import Comment, Group, Post
 
 User = get_user_model()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
@@ -75,6 +88,55 @@ class PostCreateFormTests(TestCase):
             reverse('posts:profile', kwargs={'username': 'test_username'})
         )
 
+    def test_post_create_schedules_thumbnail(self):
+        """Картинка нового поста уходит в очередь превью."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'test_thumbnail', 'image': uploaded},
+        )
+        post = Post.objects.get(text='test_thumbnail')
+        job = Job.objects.get(task='posts.tasks.build_thumbnail')
+
+        self.assertFalse(post.thumbnail)
+        self.assertEqual(jobs.run_pending(), 1)
+
+        post.refresh_from_db()
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+        self.assertEqual(
+            (post.thumbnail_width, post.thumbnail_height),
+            settings.THUMBNAIL_SIZE,
+        )
+        self.assertTrue(post.thumbnail.storage.exists(post.thumbnail.name))
+        self.assertEqual(
+            sorted(post.image_variants.values_list('width', flat=True)),
+            [settings.IMAGE_VARIANT_WIDTHS[0]],
+        )
+        self.assertContains(
+            self.authorized_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            ),
+            '480w',
+        )
+
+    def test_backfill_image_variants(self):
+        """Команда строит варианты для старых картинок."""
+        post = Post.objects.create(
+            author=self.author,
+            text='test_backfill',
+            image=SimpleUploadedFile('old.gif', SMALL_GIF, 'image/gif'),
+        )
+        out = StringIO()
+
+        call_command('backfill_image_variants', stdout=out)
+
+        self.assertTrue(post.image_variants.exists())
+        self.assertIn('Создано вариантов: 1', out.getvalue())
+
     def test_authorized_edit_post(self):
         """Проверка изменения поста с задданым id"""
         form_data = {
@@ -133,3 +195,22 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(
             Comment.objects.filter(text='test_comment', ).exists()
         )
+
+    @override_settings(
+        EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+    )
+    def test_comment_notifies_author_in_background(self):
+        """Уведомление автору о комментарии отправляет воркер."""
+        user = User.objects.create_user(
+            username='notified', email='notified@example.com'
+        )
+        post = Post.objects.create(text='text', author=user)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'test_notify'},
+        )
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(mail.outbox[0].to, ['notified@example.com'])
+        self.assertIn('test_notify', mail.outbox[0].body)
@@ -1,7 +1,14 @@
+import os
+import tempfile
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import (TestCase, TransactionTestCase,
+                         override_settings)
 
-from ..models import Group, Post
+from .. import search, threads
+from ..models import Comment, FeedEntry, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -62,3 +69,245 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='test_text')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='test_comment'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.author.stats.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.author.stats.refresh_from_db()
+
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.author.stats.followers_count, 0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет расхождения."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text='test_text') for _ in range(3)
+        )
+        UserStats.objects.filter(user=self.author).delete()
+        out = StringIO()
+
+        call_command('recount_stats', stdout=out)
+
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3
+        )
+        self.assertIn('Исправлено', out.getvalue())
+
+
+class UserDeletionTest(TransactionTestCase):
+    def test_delete_user_with_posts_comments_and_follows(self):
+        """Удаление пользователя не создаёт заново его UserStats
+        из сигналов каскада."""
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(author=author, text='test_text')
+        Post.objects.create(author=reader, text='reader_text')
+        Comment.objects.create(post=post, author=author, text='own')
+        Comment.objects.create(post=post, author=reader, text='other')
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=author, author=reader)
+
+        author.delete()
+
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertFalse(UserStats.objects.filter(user_id=author.pk).exists())
+        reader.stats.refresh_from_db()
+        self.assertEqual(reader.stats.followers_count, 0)
+        self.assertEqual(reader.stats.following_count, 0)
+        self.assertEqual(reader.stats.posts_count, 1)
+
+
+class ThreadsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+
+    def reply(self, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.author, text='Ответ', parent=parent
+        )
+
+    def fields(self):
+        return list(Comment.objects.order_by('pk').values_list(
+            'path', 'depth', 'replies_count'
+        ))
+
+    def test_paths_and_counts(self):
+        """Путь, глубина и число ответов ведутся при создании
+        и удалении комментариев."""
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        self.reply(root)
+
+        self.assertEqual(
+            grandchild.path,
+            f'{threads.segment(root.pk)}.{threads.segment(child.pk)}.'
+            f'{threads.segment(grandchild.pk)}',
+        )
+        self.assertEqual(grandchild.depth, 2)
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 3)
+
+        child.delete()
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+    @override_settings(COMMENT_MAX_DEPTH=2)
+    def test_reply_depth_is_limited(self):
+        """Ответ глубже предела встаёт рядом с родителем."""
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        comment = Comment(post=self.post, author=self.author, text='Глубже')
+
+        self.assertTrue(threads.reply_to(comment, self.post, grandchild.pk))
+        comment.save()
+
+        self.assertEqual(comment.parent_id, child.pk)
+        self.assertEqual(comment.depth, 2)
+        self.assertFalse(threads.reply_to(comment, self.post, 999))
+
+    def test_rebuild(self):
+        """``rebuild`` восстанавливает то же, что ведут сигналы."""
+        root = self.reply()
+        child = self.reply(root)
+        self.reply(child)
+        self.reply(self.reply())
+        expected = self.fields()
+        Comment.objects.update(path='', depth=0, replies_count=0)
+
+        threads.rebuild()
+
+        self.assertEqual(self.fields(), expected)
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        self.post = Post.objects.create(
+            author=self.author, group=group, text='Импортный пост'
+        )
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ответ',
+            parent=self.comment,
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self, path):
+        call_command('export_posts', path, stderr=StringIO())
+        pub_date = self.post.pub_date
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        return pub_date
+
+    def test_export_import_round_trip(self):
+        """Выгрузка загружается обратно с датами, счётчиками и лентами."""
+        for extension in ('jsonl', 'csv'):
+            with self.subTest(format=extension), \
+                    tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, f'dump.{extension}')
+                pub_date = self.export(path)
+                out = StringIO()
+
+                call_command('import_posts', path, stdout=out)
+
+                self.assertIn(
+                    'Загружено записей: 4, пропущено: 0', out.getvalue()
+                )
+                post = Post.objects.get(pk=self.post.pk)
+                self.assertEqual(post.pub_date, pub_date)
+                self.assertEqual(post.group.slug, 'group')
+                self.assertEqual(post.comments_count, 2)
+                comment = Comment.objects.get(pk=self.comment.pk)
+                self.assertEqual(comment.replies_count, 1)
+                self.assertEqual(comment.children.get().depth, 1)
+                self.assertEqual(self.author.stats.followers_count, 1)
+                self.assertTrue(FeedEntry.objects.filter(
+                    user=self.reader, post=post
+                ).exists())
+                self.assertEqual(search.search_ids('импортные'), [post.pk])
+
+    def test_import_skips_bad_records(self):
+        """Записи с неизвестными авторами и постами пропускаются,
+        а с ``--create-missing`` авторы и группы создаются."""
+        records = (
+            '{"type": "post", "author": "ghost", "group": "new", '
+            '"text": "Пост"}\n'
+            '{"type": "comment", "post": 999, "author": "reader", '
+            '"text": "Мимо"}\n'
+            '{"type": "follow", "user": "reader", "author": "author"}\n'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'records.jsonl')
+            with open(path, 'w', encoding='utf-8') as stream:
+                stream.write(records)
+            out = StringIO()
+            call_command('import_posts', path, stdout=out)
+            self.assertIn(
+                'Загружено записей: 1, пропущено: 2', out.getvalue()
+            )
+
+            call_command('import_posts', path, '--create-missing', stdout=out)
+
+        self.assertTrue(Post.objects.filter(
+            author__username='ghost', group__slug='new'
+        ).exists())
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_refresh_touches_only_imported_records(self):
+        """Пересчёт после импорта не трогает посторонние посты
+        и пользователей, а новые посты после импорта создаются."""
+        other = User.objects.create_user(username='other')
+        unrelated = Post.objects.create(author=other, text='Чужой пост')
+        Post.objects.filter(pk=unrelated.pk).update(comments_count=7)
+        UserStats.objects.filter(user=other).update(posts_count=7)
+        records = (
+            '{"type": "post", "id": 500, "author": "reader", '
+            '"text": "Свежий импорт"}\n'
+            '{"type": "comment", "post": 500, "author": "author", '
+            '"text": "Первый"}\n'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'records.jsonl')
+            with open(path, 'w', encoding='utf-8') as stream:
+                stream.write(records)
+            call_command('import_posts', path, stdout=StringIO())
+
+        self.assertEqual(Post.objects.get(pk=500).comments_count, 1)
+        self.assertEqual(search.search_ids('свежий'), [500])
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.reader.stats.posts_count, 1)
+        unrelated.refresh_from_db()
+        self.assertEqual(unrelated.comments_count, 7)
+        self.assertEqual(UserStats.objects.get(user=other).posts_count, 7)
+        self.assertGreater(
+            Post.objects.create(author=other, text='Новый').pk, 500
+        )
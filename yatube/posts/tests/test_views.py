@@ -1,14 +1,29 @@
+import os
 import shutil
 import tempfile
+from io import StringIO
+from http import HTTPStatus
+from unittest import skipUnless
+from unittest.mock import patch
 
+from core import jobs
+from core.cache import get_generations
+from core.models import Job
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Comment, Follow, Group, Post
+from posts import groups, ingest
+from posts.models import (Comment, FeedEntry, Follow, Group, Post,
+                          SearchTerm)
+from posts.search import fts_table_exists
+from posts.utils import EstimatedCountPaginator, cached_count
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -232,39 +247,116 @@ class PostPagesTests(TestCase):
         self.assertEqual(count_comment, 1)
 
     def test_cache_index(self):
-        """Проверка работы кеша"""
+        """Кеш главной страницы сбрасывается при изменении постов"""
         response = self.authorized_client.get(
             reverse(self.home_address)
         )
+        Post.objects.filter(pk=self.post.pk).update(text='test_hidden')
+        response_cached = self.authorized_client.get(
+            reverse(self.home_address)
+        )
+
+        self.assertEqual(response.content, response_cached.content)
+
         post = Post.objects.create(
             text='test_cache_post',
             author=self.author,
         )
-        cache.clear()
         response_create_post = self.authorized_client.get(
             reverse(self.home_address)
         )
 
-        self.assertNotEqual(response.content, response_create_post.content)
+        self.assertContains(response_create_post, 'test_cache_post')
 
         post.delete()
         response_delete_post = self.authorized_client.get(
             reverse(self.home_address)
         )
 
+        self.assertNotContains(response_delete_post, 'test_cache_post')
+
+    def test_cache_group_scope(self):
+        """Пост в другой группе не сбрасывает кеш страницы группы"""
+        address = reverse(self.group_address, kwargs={'slug': 'test_slug'})
+        response = self.authorized_client.get(address)
+        Post.objects.filter(group=self.group).update(text='test_hidden')
+        Post.objects.create(
+            text='test_other_group', author=self.author, group=self.group_2
+        )
+
+        self.assertEqual(
+            response.content, self.authorized_client.get(address).content
+        )
+
+        Post.objects.create(
+            text='test_same_group', author=self.author, group=self.group
+        )
+
+        self.assertContains(
+            self.authorized_client.get(address), 'test_same_group'
+        )
+
+    def test_cache_cleared(self):
+        """Новый пост появляется на главной после сброса кеша"""
+        response = self.authorized_client.get(reverse(self.home_address))
+        # Вставка в обход сигналов не сбрасывает поколение.
+        Post.objects.bulk_create([
+            Post(text='test_cache_post', author=self.author)
+        ])
+
         self.assertEqual(
-            response_create_post.content, response_delete_post.content
+            response.content,
+            self.authorized_client.get(reverse(self.home_address)).content,
         )
 
         cache.clear()
-        response_clear_cache = self.authorized_client.get(
-            reverse(self.home_address)
+
+        self.assertContains(
+            self.authorized_client.get(reverse(self.home_address)),
+            'test_cache_post',
         )
 
-        self.assertNotEqual(
-            response_delete_post.content, response_clear_cache.content
+    def test_cache_separates_visitors(self):
+        """Вошедший пользователь не получает страницу анонима"""
+        address = reverse(self.home_address)
+        anonymous = self.client.get(address)
+        authorized = self.authorized_client.get(address)
+
+        self.assertContains(anonymous, 'Войти')
+        self.assertIn('Cookie', authorized['Vary'])
+        self.assertContains(authorized, 'Выйти')
+        self.assertNotEqual(anonymous.content, authorized.content)
+        self.assertContains(self.client.get(address), 'Войти')
+
+    def test_conditional_get(self):
+        """Неизменённые страницы отдаются ответом 304"""
+        addresses = (
+            reverse(self.home_address),
+            reverse(self.group_address, kwargs={'slug': 'test_slug_2'}),
+            reverse(
+                self.profile_address, kwargs={'username': 'test_username_2'}
+            ),
+            reverse(self.detail_address, kwargs={'post_id': self.post.pk}),
         )
 
+        for address in addresses:
+            with self.subTest(address=address):
+                # Первый ответ может выставить cookie csrftoken.
+                self.authorized_client.get(address)
+                etag = self.authorized_client.get(address)['ETag']
+                response = self.authorized_client.get(
+                    address, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+                Comment.objects.create(
+                    post=self.post, author=self.author, text='test_new'
+                )
+                response = self.authorized_client.get(
+                    address, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -317,6 +409,44 @@ class PaginatorViewsTest(TestCase):
             response = self.client.get(tested_url)
             self.assertEqual(len(response.context['page_obj'].object_list), 3)
 
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        list_urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'test_name'}),
+        )
+
+        for tested_url in list_urls:
+            with self.subTest(tested_url=tested_url):
+                cache.clear()
+                first_page = self.client.get(tested_url).context['page_obj']
+                second_page = self.client.get(
+                    tested_url, {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                back_page = self.client.get(
+                    tested_url, {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+
+                self.assertIsNone(first_page.previous_cursor)
+                self.assertEqual(len(second_page.object_list), 3)
+                self.assertEqual(second_page.number, 2)
+                self.assertIsNone(second_page.next_cursor)
+                self.assertEqual(
+                    list(back_page.object_list), list(first_page.object_list)
+                )
+                self.assertIsNone(back_page.previous_cursor)
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            {'cursor': 'not-a-cursor'},
+        )
+
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj'].object_list), 10)
+
 
 class FollowViewTest(TestCase):
     def setUp(self):
@@ -377,3 +507,823 @@ class FollowViewTest(TestCase):
 
         self.assertEqual(post_text, 'test_follow')
         self.assertNotContains(response_1, 'test_follow')
+
+    def test_feed_materialized_on_write(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        post = Post.objects.create(author=self.following, text='test_new')
+
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+
+        self.client_follower.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.following.username}
+            )
+        )
+
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.follower).exists()
+        )
+
+    def test_follow_post_is_idempotent(self):
+        """Повторная подписка POST ничего не меняет дважды."""
+        url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.following.username}
+        )
+        for _ in range(2):
+            response = self.client_follower.post(url)
+
+        self.assertRedirects(response, reverse(
+            'posts:profile', kwargs={'username': self.following.username}
+        ))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.following.stats.followers_count, 1)
+        self.assertEqual(self.follower.stats.following_count, 1)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=self.post)
+        )
+
+        url = reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.following.username}
+        )
+        for _ in range(2):
+            self.client_follower.post(url)
+
+        self.following.stats.refresh_from_db()
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.following.stats.followers_count, 0)
+        self.assertFalse(FeedEntry.objects.filter(user=self.follower))
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_feed_pulls_prolific_authors_on_read(self):
+        """Посты популярных авторов попадают в ленту при чтении."""
+        Follow.objects.create(user=self.follower, author=self.following)
+        post = Post.objects.create(author=self.following, text='test_new')
+
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+        response = self.client_follower.get(reverse('posts:follow_index'))
+
+        self.assertEqual(response.context['page_obj'][0], post)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug='test_slug',
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:follow_index'),
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def count_queries(self):
+        counts = {}
+        for url in self.urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            counts[url] = len(queries)
+        return counts
+
+    def add_post(self):
+        post = Post.objects.create(
+            author=self.author, text='test_text', group=self.group
+        )
+        Comment.objects.create(
+            post=post, author=self.reader, text='test_comment'
+        )
+
+    def test_query_count_does_not_depend_on_posts(self):
+        """Число запросов на страницу ленты не растёт с числом постов."""
+        self.add_post()
+        expected = self.count_queries()
+        for _ in range(9):
+            self.add_post()
+
+        self.assertEqual(self.count_queries(), expected)
+
+    @skipUnless(connection.vendor == 'sqlite', 'План запроса SQLite')
+    def test_list_queries_use_indexes(self):
+        """Запросы лент читают индексы без полного скана и сортировки."""
+        for _ in range(12):
+            self.add_post()
+        post = Post.objects.first()
+        first_pages = self.urls + (
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        next_pages = [
+            (url, self.authorized_client.get(url).context['page_obj'])
+            for url in self.urls
+        ]
+        queries = []
+        for url in first_pages:
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                self.authorized_client.get(url)
+            queries += captured
+        for url, page_obj in next_pages:
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                self.authorized_client.get(
+                    url, {'cursor': page_obj.next_cursor}
+                )
+            queries += captured
+
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'posts_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+            with self.subTest(sql=sql):
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotRegex(plan, r'SCAN (TABLE )?posts_\w+( \||$)')
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def search(self, query):
+        response = self.authorized_client.get(
+            reverse('posts:search'), {'q': query}
+        )
+        return [post.text for post in response.context['page_obj']]
+
+    def test_search_backends(self):
+        """Поиск находит словоформы, ранжирует и следит за изменениями."""
+        for backend in ('fts5', 'inverted'):
+            with self.subTest(backend=backend), \
+                    override_settings(SEARCH_BACKEND=backend):
+                Post.objects.create(author=self.user, text='Кошки и собаки')
+                Post.objects.create(
+                    author=self.user, text='Кошка, кошке, о кошках'
+                )
+                changed = Post.objects.create(
+                    author=self.user, text='Про собак'
+                )
+                deleted = Post.objects.create(
+                    author=self.user, text='Кошкой'
+                )
+
+                self.assertEqual(
+                    self.search('кошками')[0], 'Кошка, кошке, о кошках'
+                )
+                self.assertCountEqual(
+                    self.search('собака'), ['Кошки и собаки', 'Про собак']
+                )
+
+                changed.text = 'Про кошку'
+                changed.save()
+                deleted.delete()
+
+                self.assertEqual(self.search('собаки'), ['Кошки и собаки'])
+                self.assertEqual(len(self.search('КОШКА')), 3)
+                self.assertEqual(self.search(''), [])
+                self.assertEqual(self.search('слон'), [])
+                Post.objects.all().delete()
+
+    def test_switching_backend_needs_rebuild(self):
+        """Сигналы ведут только выбранный индекс; после смены бэкенда
+        его строит rebuild_search_index, а прежний очищается."""
+        if not fts_table_exists():
+            self.skipTest('SQLite без FTS5')
+        Post.objects.create(author=self.user, text='Переезд индекса')
+        self.assertFalse(SearchTerm.objects.exists())
+
+        with override_settings(SEARCH_BACKEND='inverted'):
+            self.assertEqual(self.search('переезд'), [])
+            call_command('rebuild_search_index', stdout=StringIO())
+            self.assertEqual(self.search('переезд'), ['Переезд индекса'])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertFalse(SearchTerm.objects.exists())
+        self.assertEqual(self.search('переезд'), ['Переезд индекса'])
+
+    def test_admin_search(self):
+        """Поиск в админке использует полнотекстовый индекс."""
+        Post.objects.create(author=self.user, text='Интересные новости')
+        Post.objects.create(author=self.user, text='Скучная заметка')
+        response = self.authorized_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'новость'}
+        )
+
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Интересные новости'],
+        )
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='card_author', first_name='Анна', last_name='Каренина'
+        )
+        self.post = Post.objects.create(author=self.author, text='Карточка')
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': 'card_author'}
+        )
+
+    def test_card_variants(self):
+        """Карточка профиля и ленты кешируются отдельно."""
+        index = self.client.get(reverse('posts:index'))
+        profile = self.client.get(self.profile_url)
+
+        self.assertContains(index, 'Автор: Анна Каренина')
+        self.assertNotContains(profile, 'Автор: Анна Каренина')
+        self.assertContains(profile, 'подробная информация')
+        self.assertEqual(
+            len([key for key in cache._cache if 'post_card:' in key]), 2
+        )
+
+    def test_card_changes_with_post(self):
+        """Изменение поста и комментарии обновляют карточку."""
+        self.client.get(self.profile_url)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+
+        response = self.client.get(self.profile_url)
+
+        self.assertContains(response, 'Новый текст')
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_card_changes_with_group(self):
+        """Смена slug группы обновляет ссылку в карточке профиля."""
+        group = Group.objects.create(title='Группа', slug='old')
+        self.post.group = group
+        self.post.save()
+        self.assertContains(self.client.get(self.profile_url), '/group/old/')
+
+        group.slug = 'new'
+        group.save()
+
+        response = self.client.get(self.profile_url)
+        self.assertContains(response, '/group/new/')
+        self.assertNotContains(response, '/group/old/')
+
+    def test_card_changes_with_author(self):
+        """Смена имени автора обновляет карточку, вход — нет."""
+        index_url = reverse('posts:index')
+        scope = f'user:{self.author.pk}'
+        generation = get_generations(scope)
+        self.client.force_login(self.author)
+        self.assertEqual(get_generations(scope), generation)
+        self.assertContains(self.client.get(index_url), 'Анна Каренина')
+
+        self.author.last_name = 'Вронская'
+        self.author.save()
+
+        self.assertContains(
+            self.client.get(index_url), 'Автор: Анна Вронская'
+        )
+        self.assertContains(Client().get(index_url), 'Автор: Анна Вронская')
+
+    def test_cached_card_is_reused(self):
+        """Повторная страница не рендерит карточку заново."""
+        self.client.get(self.profile_url)
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+
+        self.assertContains(self.client.get(self.profile_url), 'Карточка')
+        with override_settings(POST_CARD_CACHE=False):
+            self.assertContains(
+                self.client.get(self.profile_url), 'Мимо сигналов'
+            )
+
+
+@override_settings(LIMIT_COMMENTS=3)
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.author, text='Обсуждение')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Ответ {number}')
+            for number in range(7)
+        )
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+        cls.list_url = reverse(
+            'posts:comment_list', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_detail_shows_first_page(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(self.detail_url)
+        comments = response.context['comments']
+
+        self.assertEqual(
+            self.texts(comments), ['Ответ 0', 'Ответ 1', 'Ответ 2']
+        )
+        self.assertEqual(response.context['comment_order'], 'oldest')
+        self.assertContains(response, 'Показать ещё')
+
+    def test_newest_first(self):
+        response = self.client.get(self.detail_url, {'order': 'newest'})
+
+        self.assertEqual(
+            self.texts(response.context['comments']),
+            ['Ответ 6', 'Ответ 5', 'Ответ 4'],
+        )
+
+    def test_load_more(self):
+        """«Показать ещё» проходит все комментарии по курсорам."""
+        first = self.client.get(self.detail_url).context['comments']
+        url = (
+            f'{self.list_url}?order=oldest&cursor={first.next_cursor}'
+        )
+        html = ''
+        while url:
+            data = self.client.get(url).json()
+            html += data['html']
+            url = data['next']
+
+        for number in range(3, 7):
+            self.assertIn(f'Ответ {number}', html)
+        self.assertNotIn('Ответ 2', html)
+        self.assertIsNone(data['next_page'])
+
+    def test_query_count_does_not_depend_on_comments(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.detail_url)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author, text='Ещё')
+            for _ in range(20)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.detail_url)
+
+        self.assertEqual(len(few), len(many))
+        comments_query = next(
+            query['sql'] for query in many
+            if 'posts_comment' in query['sql']
+        )
+        self.assertNotIn('"auth_user"."email"', comments_query)
+
+
+@override_settings(LIMIT_COMMENTS=3, COMMENT_THREAD_DEPTH=2)
+class CommentThreadsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='replier')
+        self.client.force_login(self.author)
+        self.post = Post.objects.create(author=self.author, text='Ветки')
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+
+    def comment(self, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.author, text='Ответ', parent=parent
+        )
+
+    def chain(self, length, parent=None):
+        for _ in range(length):
+            parent = self.comment(parent)
+        return parent
+
+    def test_reply_form(self):
+        root = self.comment()
+
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Ответ на корень', 'parent': root.pk},
+        )
+
+        reply = Comment.objects.get(text='Ответ на корень')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.depth, 1)
+
+    def test_thread_depth_is_limited(self):
+        """Ответы глубже предела скрыты за ссылкой на ветку."""
+        root = self.comment()
+        self.chain(4, root)
+
+        response = self.client.get(self.detail_url)
+        [shown] = response.context['comments']
+        replies = shown.replies
+
+        self.assertEqual([reply.level for reply in replies], [1, 2])
+        self.assertEqual(replies[-1].more, 2)
+        self.assertContains(response, f'?thread={replies[-1].pk}')
+        self.assertContains(response, 'Ответов: 4')
+
+        response = self.client.get(
+            self.detail_url, {'thread': replies[-1].pk}
+        )
+        [shown] = response.context['comments']
+        self.assertEqual(shown.depth, 3)
+        self.assertEqual(len(shown.replies), 1)
+
+    def test_query_count_does_not_depend_on_threads(self):
+        self.chain(3, self.comment())
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.detail_url)
+        for _ in range(3):
+            root = self.comment()
+            for _ in range(3):
+                self.chain(4, root)
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.detail_url)
+
+        self.assertEqual(len(few), len(many))
+
+
+@override_settings(COMMENT_INGEST='buffered')
+class BufferedCommentsTest(TestCase):
+    def setUp(self):
+        buffer_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, buffer_dir, ignore_errors=True)
+        # Ожидающие записи должны быть видны всем процессам.
+        buffer_settings = override_settings(
+            COMMENT_BUFFER_DIR=buffer_dir,
+            CACHES={'default': {
+                'BACKEND': 'core.cache_backends.SQLiteCache',
+                'LOCATION': os.path.join(buffer_dir, 'cache.sqlite3'),
+            }},
+        )
+        buffer_settings.enable()
+        self.addCleanup(buffer_settings.disable)
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='buffered_author', email='author@example.com'
+        )
+        self.reader = User.objects.create_user(username='buffered_reader')
+        self.client.force_login(self.reader)
+        self.post = Post.objects.create(author=self.author, text='Горячий')
+        self.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.comment_url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.pk}
+        )
+
+    def test_comment_is_written_behind(self):
+        """Комментарий сначала попадает в журнал и виден только автору."""
+        self.client.post(self.comment_url, {'text': 'Из журнала'})
+
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.client.get(self.detail_url), 'Публикуется')
+        self.assertNotContains(Client().get(self.detail_url), 'Из журнала')
+
+        self.assertEqual(ingest.flush(), 1)
+
+        comment = Comment.objects.get()
+        self.assertEqual(comment.text, 'Из журнала')
+        self.assertEqual(comment.path, f'{comment.pk:010d}')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertTrue(Job.objects.filter(
+            task='posts.tasks.notify_comment'
+        ).exists())
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, 'Из журнала', count=1)
+        self.assertNotContains(response, 'Публикуется')
+
+    def test_replies_are_batched(self):
+        root = Comment.objects.create(
+            post=self.post, author=self.author, text='Корень'
+        )
+        for number in range(3):
+            self.client.post(
+                self.comment_url,
+                {'text': f'Ответ {number}', 'parent': root.pk},
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            ingest.flush()
+
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 3)
+        self.assertEqual(
+            list(root.children.values_list('depth', flat=True)), [1, 1, 1]
+        )
+        inserts = [
+            query for query in queries
+            if query['sql'].startswith('INSERT')
+            and 'posts_comment' in query['sql'].split('(')[0]
+        ]
+        self.assertEqual(len(inserts), 1)
+
+    def test_flush_is_idempotent(self):
+        """Повторно забранный журнал не создаёт дубликатов, записи
+        об удалённых постах пропускаются."""
+        self.client.post(self.comment_url, {'text': 'Один раз'})
+        record, = ingest.pending_records(
+            self.reader.pk, self.post.pk
+        ).values()
+        ingest.append(record)
+        other = Post.objects.create(author=self.author, text='Удалённый')
+        ingest.append({**record, 'id': 'f' * 32, 'post': other.pk})
+        other.delete()
+
+        ingest.flush()
+
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_concurrent_comments_are_all_pending(self):
+        """Каждая ожидающая запись лежит под своим ключом: запись,
+        принятая в другом процессе, не затирает остальные."""
+        self.client.post(self.comment_url, {'text': 'Первый'})
+        ingest.remember_pending({
+            **ingest.pending_records(
+                self.reader.pk, self.post.pk
+            ).popitem()[1],
+            'id': 'e' * 32,
+            'text': 'Второй',
+        })
+        self.client.post(self.comment_url, {'text': 'Третий'})
+
+        response = self.client.get(self.detail_url)
+
+        for text in ('Первый', 'Второй', 'Третий'):
+            self.assertContains(response, text)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_process_cache_writes_directly(self):
+        """С кешем в памяти процесса другие воркеры не увидели бы
+        ожидающий комментарий, поэтому он вставляется сразу."""
+        self.assertFalse(ingest.enabled())
+
+        self.client.post(self.comment_url, {'text': 'Сразу'})
+
+        self.assertTrue(Comment.objects.filter(text='Сразу').exists())
+        self.assertEqual(ingest.stats()['backlog_bytes'], 0)
+
+    def test_flush_lag_metrics(self):
+        self.client.post(self.comment_url, {'text': 'Задержка'})
+        self.assertGreater(ingest.stats()['backlog_bytes'], 0)
+
+        ingest.flush()
+
+        stats = ingest.stats()
+        self.assertEqual(stats['flushed'], 1)
+        self.assertEqual(stats['backlog_bytes'], 0)
+        self.assertEqual(sum(stats['lag_s'].values()), 1)
+
+
+class AdminTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.author = User.objects.create(username='author')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {number}'
+            )
+            for number in range(5)
+        ]
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, name):
+        url = reverse(f'admin:posts_{name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [query['sql'] for query in queries]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        names = ('post', 'comment', 'follow')
+        before = {name: self.changelist_queries(name) for name in names}
+        for post in self.posts:
+            user = User.objects.create(username=f'user{post.pk}')
+            group = Group.objects.create(
+                title=f'Группа {post.pk}', slug=f'group{post.pk}'
+            )
+            Post.objects.create(author=user, group=group, text='Ещё пост')
+            Comment.objects.create(post=post, author=user, text='Ответ')
+            Follow.objects.create(user=user, author=self.author)
+        cache.clear()
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(
+                    len(self.changelist_queries(name)), len(before[name])
+                )
+
+    def test_changelist_count_is_cached(self):
+        counts = [
+            [
+                sql for sql in self.changelist_queries('post')
+                if sql.startswith('SELECT COUNT(*)')
+            ]
+            for _ in range(2)
+        ]
+        self.assertEqual(len(counts[0]), 1)
+        self.assertEqual(counts[1], [])
+
+    def test_estimated_count_for_large_table(self):
+        queryset = Post.objects.all()
+        with patch('posts.utils.table_estimate', return_value=10 ** 6):
+            self.assertEqual(
+                EstimatedCountPaginator(queryset, 10).count, 10 ** 6
+            )
+            self.assertEqual(
+                EstimatedCountPaginator(
+                    queryset.filter(author=self.author), 10
+                ).count,
+                5,
+            )
+
+    def test_batch_delete_confirms_then_deletes(self):
+        url = reverse('admin:posts_post_changelist')
+        data = {
+            'action': 'delete_selected_in_batches',
+            '_selected_action': [post.pk for post in self.posts[:3]],
+        }
+        response = self.client.post(url, data)
+        self.assertContains(response, 'Будет удалено записей: 3')
+        self.assertEqual(Post.objects.count(), 5)
+        with override_settings(ADMIN_BATCH_SIZE=2):
+            self.client.post(url, {**data, 'post': 'yes'})
+        self.assertEqual(
+            set(Post.objects.values_list('pk', flat=True)),
+            {post.pk for post in self.posts[3:]},
+        )
+
+    def test_batch_delete_keeps_counters(self):
+        post = self.posts[0]
+        comments = [
+            Comment.objects.create(
+                post=post, author=self.author, text='Комментарий'
+            )
+            for _ in range(3)
+        ]
+        with override_settings(ADMIN_BATCH_SIZE=2):
+            self.client.post(reverse('admin:posts_comment_changelist'), {
+                'action': 'delete_selected_in_batches',
+                '_selected_action': [comment.pk for comment in comments],
+                'post': 'yes',
+            })
+        post.refresh_from_db()
+        self.assertFalse(post.comments.exists())
+        self.assertEqual(post.comments_count, 0)
+
+    def test_delete_selected_replaced(self):
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertNotContains(response, 'value="delete_selected"')
+        self.assertContains(response, 'value="delete_selected_in_batches"')
+
+    def test_search_without_hits(self):
+        url = reverse('admin:posts_post_changelist')
+        response = self.client.get(url, {'q': 'несуществующее'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_search_warns_when_results_capped(self):
+        url = reverse('admin:posts_post_changelist')
+        with override_settings(SEARCH_MAX_RESULTS=2):
+            response = self.client.get(url, {'q': 'Пост'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertContains(response, 'Показаны только первые 2')
+
+    def test_cached_count_of_empty_query(self):
+        self.assertEqual(
+            cached_count(Post.objects.filter(pk__in=[]), 60), 0
+        )
+
+
+class GroupPagesCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        groups.reset()
+        self.author = User.objects.create(username='author')
+        self.group = Group.objects.create(title='Группа', slug='hot')
+        self.url = reverse('posts:group_list', args=(self.group.slug,))
+
+    def test_group_map_skips_database(self):
+        groups.get_group(self.group.slug)
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get_group(self.group.slug), self.group)
+
+    def test_group_save_invalidates_map(self):
+        groups.get_group(self.group.slug)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertEqual(
+            groups.get_group(self.group.slug).title, 'Новое название'
+        )
+
+    def test_renamed_group_old_url_not_cached(self):
+        """После смены slug старый адрес группы не отдаётся из кеша."""
+        self.assertEqual(self.client.get(self.url).status_code, HTTPStatus.OK)
+        self.group.slug = 'new'
+        self.group.save()
+
+        self.assertEqual(
+            self.client.get(self.url).status_code, HTTPStatus.NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:group_list', args=('new',))
+            ).status_code,
+            HTTPStatus.OK,
+        )
+
+    def test_new_post_warms_first_page(self):
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Горячий пост'
+        )
+        self.assertTrue(Job.objects.filter(
+            task='posts.tasks.warm_group_page'
+        ).exists())
+        jobs.run_pending()
+        response = self.client.get(self.url)
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.assertContains(response, 'Горячий пост')
+        self.assertEqual(
+            groups.stats()[self.group.slug],
+            {'hits': 1, 'misses': 0, 'hit_rate': 1.0},
+        )
+
+    def test_burst_of_posts_warms_page_once(self):
+        for number in range(3):
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {number}'
+            )
+        self.assertEqual(Job.objects.filter(
+            task='posts.tasks.warm_group_page'
+        ).count(), 1)
+
+    def test_stats_summed_across_processes(self):
+        self.client.get(self.url)
+        # Счётчик, который сбросил в общий кеш другой процесс.
+        cache.set(
+            groups.STATS_KEY.format(slug='hot', event='misses'), 2, None
+        )
+        self.assertEqual(
+            groups.stats()['hot'], {'hits': 0, 'misses': 3, 'hit_rate': 0.0}
+        )
+
+    def test_first_page_cache_shared_between_visitors(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, group=self.group, text=f'Пост {number}')
+            for number in range(settings.LIMIT_POSTS + 1)
+        )
+        user = User.objects.create(username='reader')
+        reader = Client()
+        reader.force_login(user)
+        first = self.client.get(self.url).context['page_obj']
+        second = reader.get(self.url).context['page_obj']
+        self.assertEqual(list(second), list(first))
+        self.assertEqual(second.next_cursor, first.next_cursor)
+        self.assertEqual(
+            groups.stats()[self.group.slug]['hits'], 1
+        )
+        response = self.client.get(self.url, {'cursor': first.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_metrics_for_staff(self):
+        self.client.get(self.url)
+        url = reverse('group_cache_metrics')
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(
+            self.client.get(url).json()[self.group.slug]['misses'], 1
+        )
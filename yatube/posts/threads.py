@@ -0,0 +1,164 @@
+"""Ветки комментариев на материализованном пути.
+
+``path`` комментария — номера его предков и его собственный, каждый
+дополнен нулями до ``SEGMENT`` знаков, через точку:
+``0000000007.0000000012``. Сортировка по ``path`` даёт обход ветки
+в глубину, а все потомки комментария лежат в диапазоне
+``path + '.'`` … ``path + '/'`` индекса ``(post, path)``. Поэтому
+страница веток — два запроса при любой глубине и ширине: корни
+страницы и все их потомки до ``COMMENT_THREAD_DEPTH`` уровней.
+
+``replies_count`` — число всех потомков комментария; его, как и путь,
+поддерживают сигналы. После вставок в обход сигналов (импорт,
+генератор данных) всё пересчитывает ``rebuild``.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (CharField, Count, F, OuterRef, Q, Subquery,
+                              Value)
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
+
+from .models import Comment
+
+SEGMENT = 10
+SEPARATOR = '.'
+# Следующий за точкой символ ASCII: верхняя граница диапазона потомков.
+AFTER = '/'
+
+
+def segment(pk):
+    return f'{pk:0{SEGMENT}d}'
+
+
+def ancestor_ids(path):
+    return [int(part) for part in path.split(SEPARATOR)[:-1]]
+
+
+def reply_to(comment, post, parent_id):
+    """Делает ``comment`` ответом на комментарий ``parent_id`` того же
+    поста. Ответ глубже ``COMMENT_MAX_DEPTH`` становится соседом
+    родителя. Возвращает False, если родителя нет."""
+    try:
+        parent_id = int(parent_id)
+    except (TypeError, ValueError):
+        return False
+    parent_path = Comment.objects.filter(
+        post=post, pk=parent_id
+    ).values_list('path', flat=True).first()
+    if not parent_path:
+        return False
+    parts = parent_path.split(SEPARATOR)
+    if len(parts) > settings.COMMENT_MAX_DEPTH:
+        parts.pop()
+    comment.parent_id = int(parts[-1])
+    comment.path = SEPARATOR.join(parts) + SEPARATOR
+    return True
+
+
+def attach(comment):
+    """Дописывает путь нового комментария и увеличивает счётчики
+    ответов его предков."""
+    prefix = comment.path
+    if comment.parent_id and not prefix:
+        prefix = Comment.objects.values_list('path', flat=True).get(
+            pk=comment.parent_id
+        ) + SEPARATOR
+    comment.path = prefix + segment(comment.pk)
+    comment.depth = comment.path.count(SEPARATOR)
+    Comment.objects.filter(pk=comment.pk).update(
+        path=comment.path, depth=comment.depth
+    )
+    change_replies(comment.path, 1)
+
+
+def change_replies(path, delta):
+    ids = ancestor_ids(path)
+    if ids:
+        Comment.objects.filter(pk__in=ids).update(
+            replies_count=F('replies_count') + delta
+        )
+
+
+def get_thread(post, comment_id):
+    """Комментарий поста, ветку которого показывают отдельно, или None."""
+    try:
+        return post.comments.for_thread().get(pk=int(comment_id))
+    except (TypeError, ValueError, Comment.DoesNotExist):
+        return None
+
+
+def roots(post, thread=None):
+    """Комментарии верхнего уровня страницы: корни веток поста или
+    прямые ответы на ``thread``."""
+    return post.comments.for_thread().filter(
+        parent=thread.pk if thread else None
+    )
+
+
+def load_replies(comments, depth):
+    """Загружает одним запросом потомков ``comments`` не глубже
+    ``depth`` уровней и раскладывает их в ``comment.replies`` в порядке
+    обхода ветки. У ответа ``level`` — уровень относительно корня,
+    ``more`` — число скрытых за ограничением глубины ответов."""
+    for comment in comments:
+        comment.replies = []
+    if not comments or depth < 1:
+        return comments
+    condition = Q()
+    for comment in comments:
+        condition |= Q(
+            path__gt=comment.path + SEPARATOR,
+            path__lt=comment.path + AFTER,
+        )
+    top = comments[0].depth
+    replies = Comment.objects.for_thread().filter(
+        condition,
+        post_id=comments[0].post_id,
+        depth__lte=top + depth,
+    ).order_by('path')
+    by_path = {comment.path: comment for comment in comments}
+    width = len(comments[0].path)
+    for reply in replies:
+        reply.level = reply.depth - top
+        reply.more = reply.replies_count if reply.level == depth else 0
+        by_path[reply.path[:width]].replies.append(reply)
+    return comments
+
+
+def segment_expression():
+    return LPad(Cast('pk', CharField()), SEGMENT, Value('0'))
+
+
+def rebuild(post_ids=None):
+    """Пересчитывает пути, глубину и счётчики ответов комментариев
+    всех постов или только ``post_ids``, уровень за уровнем."""
+    comments = Comment.objects.all()
+    if post_ids is not None:
+        comments = comments.filter(post_id__in=post_ids)
+    with transaction.atomic():
+        comments.filter(parent=None).update(
+            path=segment_expression(), depth=0
+        )
+        comments.exclude(parent=None).update(path='')
+        parents = Comment.objects.filter(pk=OuterRef('parent_id'))
+        while comments.filter(path='').exclude(
+            parent__path=''
+        ).update(
+            path=Concat(
+                Subquery(parents.values('path')),
+                Value(SEPARATOR),
+                segment_expression(),
+            ),
+            depth=Subquery(parents.values('depth')) + 1,
+        ):
+            pass
+        descendants = Comment.objects.filter(
+            post_id=OuterRef('post_id'),
+            path__gt=Concat(OuterRef('path'), Value(SEPARATOR)),
+            path__lt=Concat(OuterRef('path'), Value(AFTER)),
+        ).order_by().values('post_id').annotate(
+            total=Count('pk')
+        ).values('total')
+        comments.update(
+            replies_count=Coalesce(Subquery(descendants), Value(0))
+        )
@@ -0,0 +1,56 @@
+"""Построение превью картинок постов в фоне.
+
+При загрузке картинки в очередь заданий (``core.jobs``) ставится
+задача ``posts.tasks.build_thumbnail``, её выполняет воркер
+``manage.py run_worker``. Готовое превью и его размеры записываются
+в ``Post`` вместе с адаптивными вариантами (см. ``posts.variants``),
+поэтому при выводе ленты PIL и хранилище не нужны.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from . import variants
+
+
+def render_thumbnail(source, size):
+    """Обрезает картинку по центру до ``size`` с увеличением."""
+    width, height = size
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+        scale = max(width / image.width, height / image.height)
+        resized = image.resize(
+            (
+                max(width, round(image.width * scale)),
+                max(height, round(image.height * scale)),
+            ),
+            Image.LANCZOS,
+        )
+    left = (resized.width - width) // 2
+    top = (resized.height - height) // 2
+    cropped = resized.crop((left, top, left + width, top + height))
+    buffer = BytesIO()
+    cropped.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def process(post):
+    """Строит превью и адаптивные варианты картинки поста."""
+    with post.image.open('rb') as source:
+        content = render_thumbnail(source, settings.THUMBNAIL_SIZE)
+    name = '{}_{}x{}.jpg'.format(
+        os.path.splitext(os.path.basename(post.image.name))[0],
+        *settings.THUMBNAIL_SIZE,
+    )
+    variants.build(post)
+    old_thumbnail = post.thumbnail.name
+    post.thumbnail.save(name, ContentFile(content), save=False)
+    post.thumbnail_width, post.thumbnail_height = settings.THUMBNAIL_SIZE
+    post.save(update_fields=(
+        'thumbnail', 'thumbnail_width', 'thumbnail_height'
+    ))
+    if old_thumbnail and old_thumbnail != post.thumbnail.name:
+        post.thumbnail.storage.delete(old_thumbnail)
@@ -0,0 +1,419 @@
+"""Массовый импорт и экспорт постов, комментариев и подписок.
+
+Записи — плоские словари с ключом ``type`` (``post``, ``comment``,
+``follow``) — читаются и пишутся потоком в JSON Lines или CSV, так что
+память не зависит от объёма. Авторы и группы указываются по
+``username`` и ``slug``; посты и комментарии сохраняют ``id``, если он
+задан, чтобы комментарии могли ссылаться на импортированные посты.
+При экспорте посты идут раньше комментариев и подписок — в таком же
+порядке записи нужно подавать на импорт.
+
+Вставка идёт через ``bulk_create`` пачками, каждая пачка в своей
+транзакции, поэтому сигналы не срабатывают: после импорта счётчики,
+ленты подписок, поисковый индекс и ветки комментариев пересчитываются
+для затронутых пользователей и постов (см. ``refresh``). Посты без
+``id`` получают номера после наибольшего существующего, поэтому новые
+посты — это посты с явными ``id`` и все, чей номер больше запомненного
+до импорта.
+"""
+import csv
+import json
+import multiprocessing
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED,
+                                ProcessPoolExecutor, wait)
+from contextlib import contextmanager
+from itertools import groupby, islice
+
+import django
+from core.cache import bump_generation
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, search, threads
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TYPES = ('post', 'comment', 'follow')
+CSV_FIELDS = (
+    'type', 'id', 'post', 'parent', 'user', 'author', 'group',
+    'text', 'pub_date', 'created', 'image',
+)
+FORMATS = ('jsonl', 'csv')
+
+
+@contextmanager
+def manual_dates():
+    """Отключает ``auto_now_add``, чтобы сохранить даты из данных.
+
+    Меняет поля моделей для всего процесса, поэтому годится только
+    для команд и скриптов, но не для веб-процесса.
+    """
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+EXPORTS = {
+    'post': (Post, {
+        'id': 'id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comment': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'parent': 'parent_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follow': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+def export_records(types=TYPES, chunk_size=2000):
+    for kind in TYPES:
+        if kind not in types:
+            continue
+        model, columns = EXPORTS[kind]
+        rows = model.objects.order_by('pk').values_list(*columns.values())
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield {'type': kind, **dict(zip(columns, row))}
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def write_records(records, stream, format):
+    """Пишет записи в поток; возвращает их число."""
+    count = 0
+    if format == 'csv':
+        writer = csv.DictWriter(stream, CSV_FIELDS, restval='')
+        writer.writeheader()
+    for record in records:
+        record = {key: _serialize(value) for key, value in record.items()}
+        if format == 'csv':
+            writer.writerow(record)
+        else:
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def read_records(stream, format):
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value or None for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Lookup:
+    """Кеш соответствия естественного ключа (``username``, ``slug``)
+    и ``id``; недостающие ключи загружаются одним запросом на пачку."""
+
+    def __init__(self, model, field, make=None):
+        self.model = model
+        self.field = field
+        self.make = make
+        self.ids = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key and key not in self.ids}
+        if not missing:
+            return
+        self.ids.update(self._fetch(missing))
+        missing -= self.ids.keys()
+        if missing and self.make:
+            self.model.objects.bulk_create(
+                [self.make(key) for key in missing], ignore_conflicts=True
+            )
+            self.ids.update(self._fetch(missing))
+
+    def _fetch(self, keys):
+        return self.model.objects.filter(
+            **{f'{self.field}__in': keys}
+        ).values_list(self.field, 'pk')
+
+    def get(self, key):
+        return self.ids.get(key)
+
+
+class Changes:
+    """Что затронул импорт: области кеша, пользователи, посты."""
+
+    def __init__(self):
+        self.scopes = set()
+        # Пользователи, чьи счётчики и посты в лентах нужно пересчитать.
+        self.user_ids = set()
+        self.author_ids = set()
+        # Посты с явными id и посты, получившие комментарии.
+        self.post_ids = set()
+        self.commented_ids = set()
+        self.posts_after = 0
+
+    def update(self, other):
+        self.scopes |= other.scopes
+        self.user_ids |= other.user_ids
+        self.author_ids |= other.author_ids
+        self.post_ids |= other.post_ids
+        self.commented_ids |= other.commented_ids
+
+
+class Importer:
+    def __init__(self, create_missing=False):
+        password = make_password(None)
+        self.users = Lookup(
+            User, 'username',
+            create_missing and (
+                lambda name: User(username=name, password=password)
+            ),
+        )
+        self.groups = Lookup(
+            Group, 'slug',
+            create_missing and (
+                lambda slug: Group(title=slug, slug=slug, description='')
+            ),
+        )
+
+    def import_batch(self, kind, records):
+        """Импортирует пачку записей одного типа.
+
+        Возвращает ``(imported, errors, changes)``, где ``changes`` —
+        затронутые записи (``Changes``).
+        """
+        build = getattr(self, f'build_{kind}')
+        objects, changes = [], Changes()
+        self.users.load(
+            name for record in records
+            for name in (record.get('author'), record.get('user'))
+        )
+        self.groups.load(record.get('group') for record in records)
+        post_ids = set(Post.objects.filter(pk__in={
+            record.get('post') for record in records
+        }).values_list('pk', flat=True)) if kind == 'comment' else set()
+        for record in records:
+            obj = build(record, post_ids, changes)
+            if obj is not None:
+                objects.append(obj)
+        imported = _insert(type(objects[0]), objects) if objects else 0
+        return imported, len(records) - imported, changes
+
+    def build_post(self, record, post_ids, changes):
+        author_id = self.users.get(record.get('author'))
+        group_id = self.groups.get(record.get('group'))
+        if author_id is None or (record.get('group') and group_id is None):
+            return None
+        changes.scopes.update(('posts', f'author:{record["author"]}'))
+        if group_id:
+            changes.scopes.add(f'group:{record["group"]}')
+        changes.user_ids.add(author_id)
+        changes.author_ids.add(author_id)
+        if _parse_id(record.get('id')) is not None:
+            changes.post_ids.add(_parse_id(record.get('id')))
+        return Post(
+            pk=record.get('id'),
+            text=record.get('text') or '',
+            pub_date=_parse_date(record.get('pub_date')),
+            author_id=author_id,
+            group_id=group_id,
+            image=record.get('image') or '',
+        )
+
+    def build_comment(self, record, post_ids, changes):
+        author_id = self.users.get(record.get('author'))
+        post_id = _parse_id(record.get('post'))
+        if author_id is None or post_id not in post_ids:
+            return None
+        changes.scopes.update(('posts', f'post:{post_id}'))
+        changes.commented_ids.add(post_id)
+        return Comment(
+            pk=record.get('id'),
+            post_id=post_id,
+            parent_id=_parse_id(record.get('parent')),
+            author_id=author_id,
+            text=record.get('text') or '',
+            created=_parse_date(record.get('created')),
+        )
+
+    def build_follow(self, record, post_ids, changes):
+        user_id = self.users.get(record.get('user'))
+        author_id = self.users.get(record.get('author'))
+        if None in (user_id, author_id) or user_id == author_id:
+            return None
+        changes.scopes.update((
+            f'author:{record["user"]}', f'author:{record["author"]}'
+        ))
+        changes.user_ids.update((user_id, author_id))
+        changes.author_ids.add(author_id)
+        return Follow(user_id=user_id, author_id=author_id)
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_date(value):
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        return timezone.now()
+    if timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    return parsed
+
+
+def _insert(model, objects):
+    """Вставляет пачку; если она не проходит целиком, вставляет
+    по одной записи и пропускает ошибочные. Возвращает число вставленных."""
+    ignore = model is Follow
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(objects, ignore_conflicts=ignore)
+        return len(objects)
+    except IntegrityError:
+        pass
+    imported = 0
+    for obj in objects:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([obj], ignore_conflicts=ignore)
+            imported += 1
+        except IntegrityError:
+            pass
+    return imported
+
+
+def batches(records, batch_size):
+    """Пачки подряд идущих записей одного типа: ``(type, records)``."""
+    for kind, group in groupby(records, key=lambda record: record['type']):
+        if kind not in TYPES:
+            raise ValueError(f'Неизвестный тип записи: {kind}')
+        while True:
+            batch = list(islice(group, batch_size))
+            if not batch:
+                break
+            yield kind, batch
+
+
+_worker_importer = None
+
+
+def _import_in_worker(kind, records, create_missing):
+    global _worker_importer
+    if _worker_importer is None:
+        _worker_importer = Importer(create_missing)
+    with manual_dates():
+        return _worker_importer.import_batch(kind, records)
+
+
+class Result:
+    def __init__(self):
+        self.imported = dict.fromkeys(TYPES, 0)
+        self.errors = 0
+        self.changes = Changes()
+        self.changes.posts_after = (
+            Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        )
+
+    def add(self, kind, outcome):
+        imported, errors, changes = outcome
+        self.imported[kind] += imported
+        self.errors += errors
+        self.changes.update(changes)
+
+
+def import_records(records, batch_size=1000, workers=1,
+                   create_missing=False):
+    """Импортирует записи; ``workers > 1`` раздаёт пачки процессам.
+
+    Пачки разных типов не перемешиваются: комментарии начинают
+    вставляться только после того, как вставлены все посты.
+    """
+    result = Result()
+    if workers <= 1:
+        importer = Importer(create_missing)
+        with manual_dates():
+            for kind, batch in batches(records, batch_size):
+                result.add(kind, importer.import_batch(kind, batch))
+        reset_sequences()
+        return result
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    ) as pool:
+        pending, current = {}, None
+        for kind, batch in batches(records, batch_size):
+            if kind != current or len(pending) >= workers * 2:
+                done, _ = wait(
+                    pending,
+                    return_when=(
+                        FIRST_COMPLETED if kind == current else ALL_COMPLETED
+                    ),
+                )
+                for future in done:
+                    result.add(pending.pop(future), future.result())
+                current = kind
+            future = pool.submit(
+                _import_in_worker, kind, batch, create_missing
+            )
+            pending[future] = kind
+        for future in wait(pending).done:
+            result.add(pending[future], future.result())
+    reset_sequences()
+    return result
+
+
+def reset_sequences():
+    """Сдвигает последовательности id за вставленные явные ``id``,
+    иначе следующая вставка на PostgreSQL получит занятый номер.
+    SQLite сдвигает счётчик сам при вставке явного ``id``."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [Post, Comment]
+    )
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def refresh(changes):
+    """Пересчитывает для затронутых импортом пользователей и постов
+    то, что не обновили сигналы."""
+    new_posts = Post.objects.filter(
+        Q(pk__gt=changes.posts_after) | Q(pk__in=changes.post_ids)
+    )
+    counters.recount(
+        user_ids=changes.user_ids, post_ids=changes.commented_ids
+    )
+    feed.fill(author_ids=sorted(changes.author_ids))
+    search.rebuild(posts=new_posts)
+    threads.rebuild(post_ids=changes.commented_ids)
+    bump_generation(*changes.scopes)
@@ -1,9 +1,247 @@
+import base64
+import hashlib
+import json
+from types import SimpleNamespace
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import threads
+
+POST_ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERINGS = {
+    'oldest': ('created', 'pk'),
+    'newest': ('-created', '-pk'),
+}
+
+# Меньше этого оценке планировщика не верим и считаем честно.
+ESTIMATE_THRESHOLD = 10000
+
+NEXT = 'n'
+PREVIOUS = 'p'
+DIRECTIONS = (NEXT, PREVIOUS)
+
+
+def cached_count(queryset, timeout):
+    """``COUNT(*)``, закешированный по тексту запроса на ``timeout``."""
+    try:
+        query = str(queryset.query).encode()
+    except EmptyResultSet:
+        # Например, ``filter(pk__in=[])``: запрос заведомо пуст.
+        return 0
+    key = 'paginator_count:' + hashlib.md5(query).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+def table_estimate(model):
+    """Оценка числа строк таблицы из статистики базы или None.
+
+    SQLite берёт её из ``sqlite_stat1`` (заполняет ``ANALYZE``),
+    PostgreSQL — из ``pg_class.reltuples``.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                'SELECT max(CAST(stat AS INTEGER)) FROM sqlite_stat1 '
+                'WHERE tbl = %s',
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор без ``COUNT(*)`` по большой таблице.
+
+    Для запроса без условий число строк берётся из статистики базы,
+    если таблица больше ``ESTIMATE_THRESHOLD``; иначе — точный
+    ``COUNT(*)``, закешированный на ``PAGINATOR_COUNT_TIMEOUT``.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = table_estimate(queryset.model)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return cached_count(queryset, settings.PAGINATOR_COUNT_TIMEOUT)
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по набору полей сортировки.
 
+    Страница выбирается условием ``WHERE (pub_date, id) < (...)``
+    по последней записи предыдущей страницы, поэтому страница N
+    стоит столько же, сколько первая. Позиция передаётся в
+    непрозрачном токене ``?cursor=``.
+    """
 
-def paginator(request, post_list):
-    paginator = Paginator(post_list, settings.LIMIT_POSTS)
+    def __init__(self, object_list, per_page, ordering=POST_ORDERING,
+                 approximate_count=False, count_timeout=None, **kwargs):
+        self.ordering = ordering
+        self.approximate_count = approximate_count
+        self.count_timeout = count_timeout
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count:
+            return self.object_list.count()
+        return cached_count(self.object_list, self.count_timeout)
+
+    def _fields(self):
+        model = self.object_list.model
+        for name in self.ordering:
+            attr = name.lstrip('-')
+            field = (
+                model._meta.pk if attr == 'pk'
+                else model._meta.get_field(attr)
+            )
+            yield attr, field, name.startswith('-')
+
+    def encode_cursor(self, obj, direction, number):
+        values = []
+        for attr, field, _ in self._fields():
+            if isinstance(obj, dict):
+                # Строка из values(): колонка pk называется по attname.
+                value = obj[attr] if attr in obj else obj[field.attname]
+                row = SimpleNamespace(**{field.attname: value})
+            else:
+                row = obj
+            values.append(field.value_to_string(row))
+        raw = json.dumps({'d': direction, 'n': number, 'v': values})
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (direction, number, values) или None."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw.decode())
+            fields = list(self._fields())
+            if len(data['v']) != len(fields) or data['d'] not in DIRECTIONS:
+                return None
+            values = [
+                field.to_python(value)
+                for (_, field, _), value in zip(fields, data['v'])
+            ]
+            return data['d'], max(int(data['n']), 1), values
+        except (ValueError, TypeError, KeyError, ValidationError):
+            return None
+
+    def _seek(self, values, direction):
+        """Условие «строго после/до позиции» для составного ключа."""
+        condition = Q()
+        equal = {}
+        for (attr, _, descending), value in zip(self._fields(), values):
+            forward = descending == (direction == NEXT)
+            lookup = '__lt' if forward else '__gt'
+            condition |= Q(**equal, **{attr + lookup: value})
+            equal[attr] = value
+        return condition
+
+    def _attach_cursors(self, page, has_next, has_previous):
+        rows = page.object_list
+        page.next_cursor = page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self.encode_cursor(
+                rows[-1], NEXT, page.number + 1
+            )
+        if rows and has_previous:
+            page.previous_cursor = self.encode_cursor(
+                rows[0], PREVIOUS, page.number - 1
+            )
+        page.total = self.count if self.approximate_count else None
+        return page
+
+    def get_cursor_page(self, cursor=None):
+        position = self.decode_cursor(cursor) if cursor else None
+        queryset = self.object_list
+        direction, number = NEXT, 1
+        if position is not None:
+            direction, number, values = position
+            queryset = queryset.filter(self._seek(values, direction))
+            if direction == PREVIOUS:
+                queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        return self._attach_cursors(
+            Page(rows, number, self), has_next, has_previous
+        )
+
+    def first_page_of(self, rows, has_next):
+        """Первая страница из уже выбранных строк, например из постов
+        по закешированному списку id."""
+        return self._attach_cursors(Page(rows, 1, self), has_next, False)
+
+    def _get_page(self, *args, **kwargs):
+        # Старые ссылки вида ?page=N обслуживаются через OFFSET,
+        # но дальше навигация идёт по курсорам.
+        page = super()._get_page(*args, **kwargs)
+        page.object_list = list(page.object_list)
+        return self._attach_cursors(
+            page, page.number < self.num_pages, page.number > 1
+        )
+
+
+def feed_paginator(post_list, ordering=POST_ORDERING):
+    return CursorPaginator(
+        post_list,
+        settings.LIMIT_POSTS,
+        ordering=ordering,
+        approximate_count=settings.PAGINATOR_APPROXIMATE_COUNT,
+        count_timeout=settings.PAGINATOR_COUNT_TIMEOUT,
+    )
+
+
+def paginator(request, post_list, ordering=POST_ORDERING):
+    paginator = feed_paginator(post_list, ordering)
     page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return page
+    if page_number and 'cursor' not in request.GET:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+def comments_page(request, post):
+    """Страница веток комментариев по курсору и порядок ``?order=``.
+
+    ``?thread=`` показывает ответы на один комментарий; он доступен
+    как ``page.thread``.
+    """
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = 'oldest'
+    thread = threads.get_thread(post, request.GET.get('thread'))
+    paginator = CursorPaginator(
+        threads.roots(post, thread),
+        settings.LIMIT_COMMENTS,
+        ordering=COMMENT_ORDERINGS[order],
+    )
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    threads.load_replies(page.object_list, settings.COMMENT_THREAD_DEPTH)
+    page.thread = thread
+    return page, order
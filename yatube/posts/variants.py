@@ -0,0 +1,97 @@
+"""Адаптивные варианты картинок постов (несколько ширин и форматов).
+
+Кодирование идёт в пуле процессов, в базу записываются
+``PostImageVariant``, по которым шаблон строит ``<picture>``/``srcset``.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from core.cache import bump_generation
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from . import imaging
+from .models import PostImageVariant
+from .scopes import post_scopes
+
+_pool = None
+
+
+def pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_PROCESSES,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _pool
+
+
+def render(data):
+    args = (
+        data,
+        settings.IMAGE_VARIANT_WIDTHS,
+        imaging.supported_formats(settings.IMAGE_VARIANT_FORMATS),
+        settings.THUMBNAIL_SIZE,
+    )
+    if not settings.IMAGE_VARIANT_PROCESSES:
+        return imaging.render_variants(*args)
+    return pool().submit(imaging.render_variants, *args).result()
+
+
+def read_image(post):
+    with post.image.open('rb') as source:
+        return source.read()
+
+
+def save_variants(post, rendered):
+    """Заменяет варианты картинки поста построенными ``rendered``."""
+    base = os.path.splitext(os.path.basename(post.image.name))[0]
+    variants = []
+    for width, height, name, content in rendered:
+        variant = PostImageVariant(
+            post=post, width=width, height=height, format=name
+        )
+        extension = 'jpg' if name == 'jpeg' else name
+        variant.image.save(
+            f'{base}_{width}w.{extension}', ContentFile(content), save=False
+        )
+        variants.append(variant)
+    old = list(post.image_variants.all())
+    with transaction.atomic():
+        PostImageVariant.objects.filter(post=post).delete()
+        PostImageVariant.objects.bulk_create(variants)
+    for variant in old:
+        variant.image.storage.delete(variant.image.name)
+    bump_generation(*post_scopes(post.pk))
+    return variants
+
+
+def build(post):
+    """Строит и сохраняет варианты картинки поста."""
+    if not post.image:
+        return save_variants(post, [])
+    return save_variants(post, render(read_image(post)))
+
+
+def build_many(posts):
+    """Строит варианты для нескольких постов параллельно."""
+    posts = [post for post in posts if post.image]
+    if not settings.IMAGE_VARIANT_PROCESSES:
+        return sum(len(build(post)) for post in posts)
+    formats = imaging.supported_formats(settings.IMAGE_VARIANT_FORMATS)
+    futures = [
+        (post, pool().submit(
+            imaging.render_variants,
+            read_image(post),
+            settings.IMAGE_VARIANT_WIDTHS,
+            formats,
+            settings.THUMBNAIL_SIZE,
+        ))
+        for post in posts
+    ]
+    return sum(
+        len(save_variants(post, future.result())) for post, future in futures
+    )
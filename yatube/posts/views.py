@@ -1,26 +1,65 @@
+from core.cache import cache_page_versioned, generation_etag
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 
+from . import (counters, feed, follows, groups, ingest, search, tasks,
+               threads)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
-from .utils import paginator
+from .models import Follow, Post
+from .scopes import GROUPS_SCOPE
+from .utils import comments_page, paginator
 
 
-@cache_page(20, key_prefix='index_page')
+def index_scopes(request):
+    return ('posts',)
+
+
+def group_scopes(request, slug):
+    return (f'group:{slug}',)
+
+
+def profile_scopes(request, username):
+    # В карточках профиля есть ссылки на группы.
+    return (f'author:{username}', GROUPS_SCOPE)
+
+
+def detail_scopes(request, post_id):
+    # На странице поста есть счётчик постов автора.
+    usernames = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    )
+    return (
+        f'post:{post_id}',
+        GROUPS_SCOPE,
+        *(f'author:{name}' for name in usernames),
+    )
+
+
+@condition(etag_func=generation_etag(index_scopes))
+@cache_page_versioned('index_page', index_scopes)
 def index(request):
-    page_obj = paginator(request, Post.objects.all())
+    page_obj = paginator(request, Post.objects.for_feed())
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=generation_etag(group_scopes))
+@cache_page_versioned('group_page', group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group.objects.select_related(), slug=slug)
-    page_obj = paginator(request, group.posts.all())
+    group = groups.get_group(slug)
+    if 'page' in request.GET or 'cursor' in request.GET:
+        page_obj = paginator(request, group.posts.for_feed())
+    else:
+        page_obj = groups.first_page(group)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -28,11 +67,22 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'page_obj': search.search_page(query, request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@condition(etag_func=generation_etag(profile_scopes))
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts
-    posts_count = posts.count()
-    page_obj = paginator(request, posts.all())
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = counters.stats_for(author)
+    page_obj = paginator(request, author.posts.for_feed())
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author
@@ -41,7 +91,8 @@ def profile(request, username):
         following = False
     context = {
         'author': author,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
         'following': following,
     }
@@ -60,6 +111,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            tasks.schedule_thumbnail(post)
         return redirect('posts:profile', username=post.author)
     return render(request, 'posts/post_create.html', {'form': form})
 
@@ -77,6 +130,8 @@ def post_edit(request, post_id):
     if request.method == 'POST':
         if form.is_valid():
             form.save()
+            if 'image' in form.changed_data:
+                tasks.schedule_thumbnail(post)
             return redirect('posts:post_detail', post.pk)
     context = {
         'form': form,
@@ -100,46 +155,97 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent_id = request.POST.get('parent')
+        if parent_id and not threads.reply_to(comment, post, parent_id):
+            return redirect('posts:post_detail', post_id=post_id)
+        if ingest.enabled():
+            # Уведомление отправит flush_comments после вставки.
+            ingest.submit(comment)
+            return redirect('posts:post_detail', post_id=post_id)
         comment.save()
+        if post.author.email and post.author != request.user:
+            tasks.notify_comment.delay(comment.pk)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@condition(etag_func=generation_etag(detail_scopes))
 def post_detail(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related(
-            'author',
+            'author__stats',
             'group',
-        ),
+        ).prefetch_related('image_variants'),
         pk=post_id
     )
-    posts_count = post.author.posts.count()
+    posts_count = counters.stats_for(post.author).posts_count
     form = CommentForm(request.POST or None)
+    comments, order = comments_page(request, post)
     context = {
         'post': post,
         'posts_count': posts_count,
         'form': form,
-        'comments': post.comments.all(),
+        'comments': comments,
+        'comment_order': order,
+        'pending_comments': ingest.pending_for(request.user, post),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_link(name, post_id, comments, order):
+    if comments.next_cursor is None:
+        return None
+    query = {'order': order, 'cursor': comments.next_cursor}
+    if comments.thread:
+        query['thread'] = comments.thread.pk
+    return f'{reverse(name, args=(post_id,))}?{urlencode(query)}'
+
+
+@condition(etag_func=generation_etag(detail_scopes))
+def comment_list(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, order = comments_page(request, post)
+    return JsonResponse({
+        'html': render_to_string(
+            'includes/comment_list.html', {'comments': comments}, request
+        ),
+        'next': comments_link(
+            'posts:comment_list', post.pk, comments, order
+        ),
+        'next_page': comments_link(
+            'posts:post_detail', post.pk, comments, order
+        ),
+    })
+
+
+@staff_member_required
+def comment_ingest_metrics(request):
+    """Задержка отложенной записи комментариев и объём журналов."""
+    return JsonResponse(ingest.stats())
+
+
+@staff_member_required
+def group_cache_metrics(request):
+    """Попадания в кеш первой страницы по группам."""
+    return JsonResponse(
+        groups.stats(), json_dumps_params={'ensure_ascii': False}
+    )
+
+
 @login_required
 def follow_index(request):
-    page_obj = paginator(
-        request,
-        Post.objects.filter(author__following__user=request.user),
-    )
+    page_obj = paginator(request, feed.timeline(request.user))
+    page_obj.object_list = feed.posts_of(page_obj.object_list)
     context = {'page_obj': page_obj, }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    user = request.user
     author = get_object_or_404(User, username=username)
-    follower_queryset = Follow.objects.filter(user=user, author=author)
-    if user != author and not follower_queryset.exists():
-        Follow.objects.create(user=user, author=author)
+    state = follows.follow(request.user, author)
+    if state.changed and author.email:
+        tasks.notify_follower.delay(request.user.pk, author.pk)
     return redirect(
         reverse('posts:profile', kwargs={'username': author.username})
     )
@@ -148,9 +254,7 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follower_queryset = Follow.objects.filter(user=request.user, author=author)
-    if follower_queryset.exists():
-        follower_queryset.delete()
+    follows.unfollow(request.user, author)
     return redirect(
         reverse('posts:profile', kwargs={'username': author.username})
     )
@@ -0,0 +1,11 @@
+import os
+
+from core.asgi import WsgiToAsgi
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WsgiToAsgi(
+    get_wsgi_application(), max_workers=settings.ASGI_THREADS
+)
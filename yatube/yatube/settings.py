@@ -5,7 +5,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = 'm1&fr6(x1sk8uh-2jqzb@6__=2p$f-!$qcukga31b(qi1(+9p$'
 
-DEBUG = True
+# YATUBE_DEBUG=0 в боевом окружении.
+DEBUG = os.getenv('YATUBE_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -20,6 +21,7 @@ INSTALLED_APPS = [
     'posts',
     'about',
     'users',
+    'api',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -31,6 +33,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -41,12 +44,21 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+# Вне DEBUG шаблоны компилируются один раз на процесс. Кеш загрузчика
+# Django 2.2 не следит за файлами, поэтому при разработке он выключен.
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -60,12 +72,51 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# ASGI-сервер (например, uvicorn yatube.asgi:application) держит
+# медленных клиентов в цикле событий, Django работает в пуле потоков.
+ASGI_THREADS = 8
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# sqlite (по умолчанию) или postgresql. Соединения не закрываются
+# после каждого запроса, а живут CONN_MAX_AGE секунд в своём потоке.
+DATABASE_ENGINE = os.getenv('YATUBE_DB', 'sqlite')
+CONN_MAX_AGE = 60
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'yatube'),
+            'USER': os.getenv('POSTGRES_USER', 'yatube'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            # За PgBouncer в режиме pool_mode=transaction серверные
+            # курсоры (QuerySet.iterator) не работают.
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('POSTGRES_PGBOUNCER') == '1'
+            ),
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+        }
     }
+
+# Применяются к каждому новому соединению SQLite (core.db).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
 }
 
 
@@ -101,11 +152,29 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 LIMIT_POSTS = 10
+LIMIT_COMMENTS = 20
+# Глубже COMMENT_MAX_DEPTH ответы не вкладываются, а встают рядом
+# с родителем; на странице ветки раскрыты на COMMENT_THREAD_DEPTH уровней.
+COMMENT_MAX_DEPTH = 8
+COMMENT_THREAD_DEPTH = 3
+
+# Запись комментариев (posts.ingest): 'direct' — INSERT на запросе,
+# 'buffered' — журнал на диске и пакетная вставка командой flush_comments.
+# 'buffered' требует общего кеша (YATUBE_CACHE=shared или two_tier).
+COMMENT_INGEST = os.getenv('YATUBE_COMMENT_INGEST', 'direct')
+COMMENT_BUFFER_DIR = os.path.join(BASE_DIR, 'comment_buffer')
+COMMENT_BUFFER_FSYNC = True
+COMMENT_FLUSH_BATCH = 500
+COMMENT_FLUSH_INTERVAL = 1
+COMMENT_PENDING_TIMEOUT = 60 * 60
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь заданий, а воркер отправляет их
+# через EMAIL_DELIVERY_BACKEND.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -115,8 +184,110 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# local — кеш в памяти процесса (разработка и тесты);
+# shared — общий для воркеров кеш в файле SQLite;
+# two_tier — LRU в памяти процесса перед общим кешем.
+CACHE_MODE = os.getenv('YATUBE_CACHE', 'local')
+
+SHARED_CACHE = {
+    'BACKEND': 'core.cache_backends.SQLiteCache',
+    'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+    'OPTIONS': {
+        'MAX_ENTRIES': 100000,
+    },
+}
+
+if CACHE_MODE == 'shared':
+    CACHES = {
+        'default': SHARED_CACHE,
     }
+elif CACHE_MODE == 'two_tier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 5,
+                'CHECK_INTERVAL': 1,
+            },
+        },
+        'shared': SHARED_CACHE,
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+PAGINATOR_APPROXIMATE_COUNT = False
+PAGINATOR_COUNT_TIMEOUT = 60
+# Раз в столько секунд процесс сбрасывает попадания в кеш страниц
+# групп в общие счётчики.
+GROUP_STATS_FLUSH_INTERVAL = 10
+# Размер пачки при массовых действиях в админке.
+ADMIN_BATCH_SIZE = 500
+
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL = 100
+
+CACHE_PAGE_TIMEOUT = 60 * 60 * 24
+# Кеш отрендеренных карточек постов в лентах (posts.templatetags.post_cards).
+POST_CARD_CACHE = True
+
+# Адрес сайта для ссылок в письмах.
+SITE_URL = os.getenv('YATUBE_SITE_URL', 'http://localhost:8000')
+
+# Очередь фоновых заданий (core.jobs). Повтор упавшего задания
+# откладывается на JOBS_RETRY_DELAY секунд, удваиваясь с каждой
+# попыткой; задание, захваченное дольше JOBS_LOCK_TIMEOUT секунд
+# назад, считается брошенным умершим воркером.
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 10
+JOBS_LOCK_TIMEOUT = 60 * 10
+JOBS_POLL_INTERVAL = 1
+
+THUMBNAIL_SIZE = (960, 339)
+
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+IMAGE_VARIANT_FORMATS = ('avif', 'webp', 'jpeg')
+IMAGE_VARIANT_PROCESSES = 2
+
+# 'fts5' — виртуальная таблица SQLite, 'inverted' — модель SearchTerm.
+# Ведётся только выбранный индекс: после смены выполните
+# manage.py rebuild_search_index.
+SEARCH_BACKEND = 'fts5'
+SEARCH_MAX_RESULTS = 1000
+
+API_MAX_LIMIT = 100
+
+# Заголовок Server-Timing раскрывает время SQL и шаблонов любому
+# клиенту, поэтому по умолчанию он есть только при отладке.
+SERVER_TIMING = os.getenv(
+    'YATUBE_SERVER_TIMING', '1' if DEBUG else '0'
+) == '1'
+# Лимиты SQL-запросов на страницу по имени URL. При превышении
+# пишется предупреждение, а при YATUBE_QUERY_BUDGET_STRICT=1 (по
+# умолчанию — при отладке и в тестах) — ошибка.
+# Запись поста дороже чтения: сигналы обновляют счётчики, ленты
+# подписчиков и поисковый индекс.
+QUERY_BUDGETS = {
+    'posts:index': 8,
+    'posts:group_list': 8,
+    'posts:profile': 10,
+    'posts:post_detail': 10,
+    'posts:follow_index': 10,
+    'posts:search': 8,
+    'posts:comment_list': 4,
+    'posts:post_create': 24,
+    'posts:post_edit': 24,
+    'api:post_list': 4,
+    'api:post_detail': 4,
+    'api:comment_list': 4,
+    'api:profile_detail': 4,
+    'api:follow_feed': 6,
 }
+QUERY_BUDGET_STRICT = os.getenv(
+    'YATUBE_QUERY_BUDGET_STRICT', '1' if DEBUG else '0'
+) == '1'
@@ -1,18 +1,32 @@
+from core.views import request_metrics
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
+from posts.views import comment_ingest_metrics, group_cache_metrics
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 handler500 = 'core.views.server_error'
 
 urlpatterns = [
+    path('admin/metrics/', request_metrics, name='request_metrics'),
+    path(
+        'admin/metrics/comments/',
+        comment_ingest_metrics,
+        name='comment_ingest_metrics',
+    ),
+    path(
+        'admin/metrics/groups/',
+        group_cache_metrics,
+        name='group_cache_metrics',
+    ),
     path('admin/', admin.site.urls),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
 ]
 
 if settings.DEBUG: